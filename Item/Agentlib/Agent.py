@@ -4,15 +4,24 @@ Agent - Agent基类
 """
 
 import asyncio
+import functools
+import hashlib
+import json
+import logging
+import random
+import re
 import time
-from typing import Dict, List, Any, Optional, Callable
-from dataclasses import dataclass, field
+from collections import deque, OrderedDict
+from concurrent.futures import Executor
+from typing import Dict, List, Any, Optional, Callable, Tuple, Deque, TextIO
+from dataclasses import dataclass, field, fields
 from enum import Enum
 
 from ..FlowTools.flow_node import FlowNode, NodeType, NodeResult
 from ..ContextEngineer.context_manager import ContextManager, StructuredContext
-from .Models import ModelBase
+from .Models import ModelBase, _LogLevelMixin, _get_background_loop, is_retryable_error, _DATACLASS_SLOTS
 from .Prompt import PromptManager
+from .Tools.batching import BatchedToolDispatcher
 
 
 class AgentRole(Enum):
@@ -23,6 +32,14 @@ class AgentRole(Enum):
     SPECIALIST = "specialist"        # 专家Agent（数学家、历史学家等）
     CUSTOM = "custom"                # 自定义Agent
 
+    @classmethod
+    def from_value(cls, value: str) -> 'AgentRole':
+        """根据字符串值获取角色（查表，未知值抛出ValueError）"""
+        try:
+            return _ROLE_BY_VALUE[value]
+        except KeyError:
+            raise ValueError(f"{value!r} is not a valid {cls.__name__}") from None
+
 
 class AgentStatus(Enum):
     """Agent状态枚举"""
@@ -33,8 +50,21 @@ class AgentStatus(Enum):
     ERROR = "error"                  # 错误状态
     TERMINATED = "terminated"        # 已终止
 
+    @classmethod
+    def from_value(cls, value: str) -> 'AgentStatus':
+        """根据字符串值获取状态（查表，未知值抛出ValueError）"""
+        try:
+            return _STATUS_BY_VALUE[value]
+        except KeyError:
+            raise ValueError(f"{value!r} is not a valid {cls.__name__}") from None
+
 
-@dataclass
+# 字符串值 -> 枚举成员的反向映射，类加载时构建一次
+_ROLE_BY_VALUE: Dict[str, AgentRole] = {role.value: role for role in AgentRole}
+_STATUS_BY_VALUE: Dict[str, AgentStatus] = {status.value: status for status in AgentStatus}
+
+
+@dataclass(**_DATACLASS_SLOTS)
 class AgentMetadata:
     """Agent元数据"""
     name: str
@@ -45,7 +75,11 @@ class AgentMetadata:
     custom_attributes: Dict[str, Any] = field(default_factory=dict)
 
 
-@dataclass
+# AgentMetadata的字段名集合，set_metadata据此区分标准字段与自定义属性
+_METADATA_FIELDS = frozenset(f.name for f in fields(AgentMetadata))
+
+
+@dataclass(**_DATACLASS_SLOTS)
 class AgentMessage:
     """Agent消息"""
     sender_id: str
@@ -56,16 +90,52 @@ class AgentMessage:
     timestamp: float = field(default_factory=time.time)
 
 
-class Agent(FlowNode):
+class MessageRingBuffer(asyncio.Queue):
+    """
+    定长消息环形缓冲区
+    
+    接口与asyncio.Queue一致；缓冲区满时写入不会等待，而是丢弃最旧的消息，
+    即使没有消费者，内存占用也有上限。
+    """
+    
+    def __init__(self, maxsize: int = 1024):
+        super().__init__(maxsize=maxsize)
+        self.dropped_count = 0
+    
+    def put_nowait(self, item: Any) -> None:
+        if self.full():
+            self.get_nowait()
+            self.task_done()
+            self.dropped_count += 1
+        super().put_nowait(item)
+    
+    async def put(self, item: Any) -> None:
+        self.put_nowait(item)
+
+
+# 可批处理工具共用的调度器，不同Agent对同一工具的调用可以合并到同一批次
+_tool_dispatcher = BatchedToolDispatcher()
+
+
+class Agent(_LogLevelMixin, FlowNode):
     """Agent基类 - 所有Agent的父类"""
     
+    # 响应中表示需要调用工具的触发短语，合并为一个正则，单次扫描即可完成检测
+    TOOL_TRIGGER_PHRASES = ("调用工具", "使用工具")
+    _TOOL_TRIGGER_RE = re.compile("|".join(map(re.escape, TOOL_TRIGGER_PHRASES)))
+    
     def __init__(self, 
                  agent_id: str,
                  name: str,
                  role: AgentRole = AgentRole.CHAT,
                  model: Optional[ModelBase] = None,
                  context_manager: Optional[ContextManager] = None,
-                 prompt_manager: Optional[PromptManager] = None):
+                 prompt_manager: Optional[PromptManager] = None,
+                 history_limit: int = 64,
+                 response_cache_size: int = 0,
+                 queue_max: int = 1024,
+                 stream_responses: bool = False,
+                 history_spill_path: Optional[str] = None):
         """
         初始化Agent
         
@@ -76,7 +146,15 @@ class Agent(FlowNode):
             model: 使用的模型实例
             context_manager: 上下文管理器
             prompt_manager: 提示词管理器
+            history_limit: 内存中保留的对话历史条数上限（至少为1），超出的旧条目交给_archive_overflow处理
+            response_cache_size: 响应缓存容量（LRU），0表示不启用缓存
+            queue_max: 消息队列容量，队列满时丢弃最旧的消息；0表示不限制
+            stream_responses: 是否以流式方式读取模型输出，片段会逐个交给on_response_chunk回调
+            history_spill_path: 滑出历史窗口的条目以JSON Lines格式追加写入该文件，None表示不落盘；文件句柄由close关闭
         """
+        if history_limit < 1:
+            raise ValueError(f"history_limit must be at least 1, got {history_limit}")
+        
         super().__init__(agent_id, NodeType.CUSTOM)
         
         # Agent基本信息
@@ -84,11 +162,15 @@ class Agent(FlowNode):
         self.role = role
         self.status = AgentStatus.IDLE
         
+        # 角色/状态的字符串形式，日志和字典构建时直接使用，避免反复访问枚举的value
+        self._role_str = role.value
+        self._status_str = AgentStatus.IDLE.value
+        
         # Agent元数据
         self.metadata = AgentMetadata(
             name=name,
             role=role,
-            description=f"{role.value} agent: {name}"
+            description=f"{self._role_str} agent: {name}"
         )
         
         # 核心组件
@@ -97,29 +179,55 @@ class Agent(FlowNode):
         self.prompt_manager = prompt_manager or PromptManager(f"{agent_id}_prompt")
         
         # 消息队列
-        self.message_queue: List[AgentMessage] = []
-        self.conversation_history: List[Dict[str, Any]] = []
+        self.message_queue: MessageRingBuffer = MessageRingBuffer(maxsize=queue_max)
+        self.history_limit = history_limit
+        self.history_spill_path = history_spill_path
+        # 落盘文件的追加句柄，首次溢出时打开并保持打开，由close关闭
+        self._spill_file: Optional[TextIO] = None
+        self.conversation_history: Deque[Dict[str, Any]] = deque(maxlen=history_limit)
+        # 摘要只需要最近3轮，单独维护，读取时不必遍历整个历史窗口
+        self._recent_turns: Deque[Dict[str, Any]] = deque(maxlen=6)
+        # 累计对话轮数，不受历史窗口大小限制
+        self._turn_count = 0
+        
+        # 响应缓存：(角色, 系统提示词, 上下文, 本轮消息)完全相同时直接复用上次的模型响应
+        self.response_cache_size = response_cache_size
+        self._response_cache: "OrderedDict[str, str]" = OrderedDict()
         
         # 工具注册
         self.available_tools: Dict[str, Callable] = {}
+        # 同步工具指定的执行器（如CPU密集型工具使用进程池），未指定的在默认线程池中执行
+        self.tool_executors: Dict[str, Executor] = {}
         
         # 其他Agent的引用（用于群聊）
         self.other_agents: Dict[str, 'Agent'] = {}
+
+        # 当前讨论设定的版本号（内容哈希），用于观察可缓存前缀是否变化
+        self.persona_pack_version: Optional[str] = None
+        # 讨论设定缓存：(Agent名称, 排序后的参与者) -> (设定文本, 版本号)
+        self._persona_block_cache: Dict[Tuple[str, ...], Tuple[str, str]] = {}
+        # 最近一次拼接好的静态前缀：(系统提示词, 讨论设定) -> 前缀文本
+        self._static_prefix_memo: Optional[Tuple[Tuple[Optional[str], str], str]] = None
+        
+        # 流式输出
+        self.stream_responses = stream_responses
         
         # 回调函数
         self.on_message_received: Optional[Callable] = None
         self.on_status_changed: Optional[Callable] = None
+        self.on_response_chunk: Optional[Callable] = None
         
-        self.log_debug(f"Agent {name} initialized", {
-            'agent_id': agent_id,
-            'role': role.value,
-            'model': type(model).__name__ if model else 'None'
-        })
+        if self._is_log_enabled(logging.DEBUG):
+            self.log_debug(f"Agent {name} initialized", {
+                'agent_id': agent_id,
+                'role': self._role_str,
+                'model': type(model).__name__ if model else 'None'
+            })
     
     def set_metadata(self, **kwargs) -> None:
         """设置Agent元数据"""
         for key, value in kwargs.items():
-            if hasattr(self.metadata, key):
+            if key in _METADATA_FIELDS:
                 setattr(self.metadata, key, value)
             else:
                 self.metadata.custom_attributes[key] = value
@@ -131,39 +239,60 @@ class Agent(FlowNode):
         # 同时更新元数据
         self.set_metadata(system_prompt=prompt)
         
-        self.log_debug(f"System prompt set for agent {self.name}", {
-            'prompt_length': len(prompt),
-            'agent_role': self.role.value
-        })
+        if self._is_log_enabled(logging.DEBUG):
+            self.log_debug(f"System prompt set for agent {self.name}", {
+                'prompt_length': len(prompt),
+                'agent_role': self._role_str
+            })
     
-    def register_tool(self, tool_name: str, tool_func: Callable, description: str = "") -> None:
-        """注册工具"""
+    def register_tool(self, tool_name: str, tool_func: Callable, description: str = "",
+                      executor: Optional[Executor] = None) -> None:
+        """
+        注册工具
+        
+        Args:
+            tool_name: 工具名称
+            tool_func: 工具函数，可以是同步函数或协程函数
+            description: 工具描述
+            executor: 同步工具使用的执行器，CPU密集型工具可传入ProcessPoolExecutor
+        """
         self.available_tools[tool_name] = tool_func
+        if executor is not None:
+            self.tool_executors[tool_name] = executor
         self.metadata.capabilities.append(f"tool:{tool_name}")
         
-        self.log_debug(f"Registered tool: {tool_name}", {
-            'description': description,
-            'total_tools': len(self.available_tools)
-        })
+        if self._is_log_enabled(logging.DEBUG):
+            self.log_debug(f"Registered tool: {tool_name}", {
+                'description': description,
+                'total_tools': len(self.available_tools)
+            })
     
     def add_other_agent(self, agent: 'Agent') -> None:
         """添加其他Agent的引用（用于群聊）"""
         self.other_agents[agent.component_id] = agent
-        self.log_debug(f"Added reference to agent: {agent.name}")
+        if self._is_log_enabled(logging.DEBUG):
+            self.log_debug(f"Added reference to agent: {agent.name}")
     
     async def receive_message(self, message: AgentMessage) -> None:
         """接收消息"""
-        self.message_queue.append(message)
+        await self.message_queue.put(message)
         
-        self.log_debug(f"Received message from {message.sender_id}", {
-            'message_type': message.message_type,
-            'content_length': len(message.content)
-        })
+        if self._is_log_enabled(logging.DEBUG):
+            self.log_debug(f"Received message from {message.sender_id}", {
+                'message_type': message.message_type,
+                'content_length': len(message.content)
+            })
         
         # 触发回调
         if self.on_message_received:
             await self.on_message_received(message)
     
+    async def next_message(self) -> AgentMessage:
+        """取出下一条待处理的消息，队列为空时等待"""
+        message = await self.message_queue.get()
+        self.message_queue.task_done()
+        return message
+    
     async def send_message(self, receiver_id: str, content: str, message_type: str = "text", metadata: Dict[str, Any] = None) -> None:
         """发送消息给其他Agent"""
         message = AgentMessage(
@@ -174,34 +303,76 @@ class Agent(FlowNode):
             metadata=metadata or {}
         )
         
-        # 如果接收者在已知的Agent中，直接发送
-        if receiver_id in self.other_agents:
-            receiver = self.other_agents[receiver_id]
+        # 如果接收者在已知的Agent中，直接发送（只查一次字典）
+        receiver = self.other_agents.get(receiver_id)
+        if receiver is not None:
             await receiver.receive_message(message)
         else:
             # 否则，将消息放入输出中，由外部系统处理
             self.log_warning(f"Unknown receiver: {receiver_id}, message queued for external handling")
         
         # 记录到对话历史
-        self.conversation_history.append({
+        self._append_history({
             'role': 'assistant',
             'content': content,
             'receiver': receiver_id,
             'timestamp': message.timestamp
         })
     
+    async def broadcast_message(self, receiver_ids: List[str], content: str, message_type: str = "text", metadata: Dict[str, Any] = None) -> None:
+        """群发消息给多个Agent，各接收者并发处理"""
+        # 消息只构建一次，所有接收者共享同一个实例
+        message = AgentMessage(
+            sender_id=self.component_id,
+            receiver_id="broadcast",
+            content=content,
+            message_type=message_type,
+            metadata=metadata or {}
+        )
+        
+        receivers = []
+        for receiver_id in receiver_ids:
+            receiver = self.other_agents.get(receiver_id)
+            if receiver is not None:
+                receivers.append(receiver)
+            else:
+                self.log_warning(f"Unknown receiver: {receiver_id}, message queued for external handling")
+        
+        results = await asyncio.gather(
+            *(receiver.receive_message(message) for receiver in receivers),
+            return_exceptions=True
+        )
+        for receiver, outcome in zip(receivers, results):
+            if isinstance(outcome, Exception):
+                self.log_error(f"Failed to deliver broadcast to {receiver.component_id}", outcome)
+        
+        # 群发只记录一条对话历史
+        self._append_history({
+            'role': 'assistant',
+            'content': content,
+            'receivers': [receiver.component_id for receiver in receivers],
+            'timestamp': message.timestamp
+        })
+    
     def _change_status(self, new_status: AgentStatus) -> None:
         """改变Agent状态"""
+        # 状态未变化时不记录日志、不触发回调
+        if new_status is self.status:
+            return
+        
         old_status = self.status
+        old_status_str = self._status_str
         self.status = new_status
+        self._status_str = new_status.value
 
         # 重要状态变化使用INFO级别，确保可见
         if new_status == AgentStatus.THINKING:
-            self.log_info(f"🔄 Agent {self.name} 状态: {old_status.value} -> {new_status.value}")
+            if self._is_log_enabled(logging.INFO):
+                self.log_info(f"🔄 Agent {self.name} 状态: {old_status_str} -> {self._status_str}")
         elif new_status == AgentStatus.ERROR:
-            self.log_error(f"🚨 Agent {self.name} 状态: {old_status.value} -> {new_status.value}")
-        else:
-            self.log_debug(f"Status changed: {old_status.value} -> {new_status.value}")
+            self.log_error(f"🚨 Agent {self.name} 状态: {old_status_str} -> {self._status_str}")
+        elif self._is_log_enabled(logging.DEBUG):
+            self.log_debug(f"Status changed: {old_status_str} -> {self._status_str}")
 
         # 触发回调
         if self.on_status_changed:
@@ -222,62 +393,74 @@ class Agent(FlowNode):
         room_context = input_data.get('room_context', {})
         is_discussion_mode = room_context.get('discussion_mode', False)
 
-        self.log_info(f"🧠 Agent {self.name} 开始思考")
-        self.log_info(f"  输入内容: {user_input[:100]}{'...' if len(user_input) > 100 else ''}")
-        self.log_info(f"  讨论模式: {is_discussion_mode}")
+        # INFO关闭时跳过输入预览的切片和拼接
+        if self._is_log_enabled(logging.INFO):
+            self.log_info(f"🧠 Agent {self.name} 开始思考")
+            self.log_info(f"  输入内容: {user_input[:100]}{'...' if len(user_input) > 100 else ''}")
+            self.log_info(f"  讨论模式: {is_discussion_mode}")
 
         self._change_status(AgentStatus.THINKING)
 
         try:
             # 1. 获取用户输入
-            self.log_debug(f"Processing user input: {len(user_input)} characters")
+            if self._is_log_enabled(logging.DEBUG):
+                self.log_debug(f"Processing user input: {len(user_input)} characters")
 
             # 2. 简化的上下文构建 - 保留接口但简化实现
-            context = None
-            try:
-                if self.context_manager:
-                    # 设置用户输入到上下文管理器
-                    self.context_manager.set_user_input(user_input)
-                    # 构建简化的上下文
-                    context = self.context_manager.build_structured_context(user_input)
-                    self.log_debug("Context building successful")
-            except Exception as ctx_error:
-                self.log_warning(f"Context building failed, using simple context: {ctx_error}")
-                # 如果上下文构建失败，使用简单的上下文
-                context = None
+            context = self._build_context(user_input)
             
             # 3. 检查是否为讨论模式并构建相应的提示词
             self.log_info(f"  构建提示词...")
 
+            # 系统提示词作为持久段单独传给模型层，不再拼进用户消息，
+            # 这样每次调用的前缀保持一致，可以命中服务商的提示词缓存
+            system_prompt = None
+            if self.prompt_manager:
+                try:
+                    system_prompt = self.prompt_manager.get_system_prompt() or None
+                except Exception as prompt_error:
+                    self.log_warning(f"Prompt building failed, using simple prompt: {prompt_error}")
+
             if is_discussion_mode:
-                prompt = self._build_discussion_prompt(user_input, room_context)
-                self.log_debug(f"Discussion prompt built, length: {len(prompt)}")
+                # 讨论设定是稳定内容，接在系统提示词之后一起作为持久前缀
+                persona_block, prompt = self._build_discussion_prompt(user_input, room_context)
+                system_prompt = self._get_static_prefix(system_prompt, persona_block)
+                if self._is_log_enabled(logging.DEBUG):
+                    self.log_debug(f"Discussion prompt built, length: {len(prompt)}")
             else:
-                # 传统模式的提示词构建
+                # 传统模式直接使用用户输入作为本轮消息
                 prompt = user_input
-                if self.prompt_manager:
-                    try:
-                        system_prompt = self.prompt_manager.get_system_prompt()
-                        if system_prompt:
-                            prompt = f"系统提示: {system_prompt}\n\n用户输入: {user_input}"
-                    except Exception as prompt_error:
-                        self.log_warning(f"Prompt building failed, using simple prompt: {prompt_error}")
 
             # 4. 调用模型
             self.log_info(f"  🤖 调用模型进行推理...")
 
-            if self.model:
+            cache_key = self._response_cache_key(system_prompt, prompt, context) if self.response_cache_size > 0 else None
+            cached_response = self._lookup_cached_response(cache_key) if cache_key else None
+
+            if cached_response is not None:
+                self.log_info(f"  ♻️ 命中响应缓存，跳过模型调用")
+                response = cached_response
+            elif self.model:
                 # 添加重试机制和详细日志
                 max_retries = 3
-                retry_delay = 1.0
+                retry_base_delay = 0.5
+                retry_max_delay = 8.0
+                # 已交给on_response_chunk回调的片段；一旦有片段送出就不再重试，否则回调会收到重复的文本
+                streamed_chunks: List[str] = []
 
                 for attempt in range(max_retries):
                     try:
                         if attempt > 0:
                             self.log_info(f"  重试模型调用 (第{attempt + 1}次尝试)")
-                            await asyncio.sleep(retry_delay * attempt)  # 递增延迟
+                            # 指数退避 + 随机抖动，避免多个Agent在限流时同步重试
+                            await asyncio.sleep(random.uniform(0, min(retry_max_delay, retry_base_delay * 2 ** attempt)))
 
-                        response = await self.model.generate(prompt, context)
+                        if self.stream_responses:
+                            response = await self._generate_streamed(prompt, context, system_prompt, streamed_chunks)
+                        else:
+                            response = await self.model.generate(prompt, context, system=system_prompt)
+                        if cache_key:
+                            self._store_cached_response(cache_key, response)
 
                         # 成功调用的日志
                         self.log_info(f"  ✅ 模型调用成功，响应长度: {len(response)} 字符")
@@ -287,12 +470,17 @@ class Agent(FlowNode):
                         error_msg = str(model_error)
                         self.log_error(f"  ❌ 模型调用失败 (尝试 {attempt + 1}/{max_retries}): {error_msg}")
 
-                        if attempt == max_retries - 1:
-                            # 最后一次尝试失败
-                            self.log_error(f"  🚫 所有重试均失败，使用错误响应")
+                        retryable = is_retryable_error(model_error)
+                        if attempt == max_retries - 1 or not retryable or streamed_chunks:
+                            # 最后一次尝试失败、错误不可重试（如密钥无效、参数错误），或部分响应已经流式送出
+                            if streamed_chunks:
+                                self.log_error(f"  🚫 部分响应已流式输出，不再重试，使用错误响应")
+                            elif retryable:
+                                self.log_error(f"  🚫 所有重试均失败，使用错误响应")
+                            else:
+                                self.log_error(f"  🚫 错误不可重试，使用错误响应")
                             response = f"[{self.name}] 抱歉，我在处理您的请求时遇到了模型调用错误。请检查API配置。错误信息: {error_msg}"
-                        else:
-                            continue
+                            break
             else:
                 # 记录模型未配置的详细信息
                 self.log_error(f"  🚫 Agent '{self.name}' 没有配置模型。请检查API密钥配置。")
@@ -308,16 +496,19 @@ class Agent(FlowNode):
 
             # 6. 更新对话历史
             self.log_debug(f"Updating conversation history")
-            self.conversation_history.append({
+            # 同一轮的用户输入和响应共用一个时间戳
+            turn_timestamp = time.time()
+            self._append_history({
                 'role': 'user',
                 'content': user_input,
-                'timestamp': time.time()
+                'timestamp': turn_timestamp
             })
-            self.conversation_history.append({
+            self._append_history({
                 'role': 'assistant',
                 'content': response,
-                'timestamp': time.time()
+                'timestamp': turn_timestamp
             })
+            self._turn_count += 1
 
             # 7. 尝试更新上下文管理器（如果可用）
             try:
@@ -328,30 +519,127 @@ class Agent(FlowNode):
                 self.log_warning(f"Context update failed: {ctx_update_error}")
 
             # 记录思考完成
-            self.log_info(f"✅ Agent {self.name} 思考完成")
-            self.log_info(f"  响应成功: {result.get('success', False)}")
-            self.log_info(f"  响应预览: {response[:100]}{'...' if len(response) > 100 else ''}")
+            if self._is_log_enabled(logging.INFO):
+                self.log_info(f"✅ Agent {self.name} 思考完成")
+                self.log_info(f"  响应成功: {result.get('success', False)}")
+                self.log_info(f"  响应预览: {response[:100]}{'...' if len(response) > 100 else ''}")
 
             return result
             
         except Exception as e:
             self._change_status(AgentStatus.ERROR)
+            # 错误文本只生成一次，日志和返回结果共用
+            error_text = str(e)
             self.log_error(f"❌ Agent {self.name} 思考过程发生严重错误", e)
             self.log_error(f"  错误类型: {type(e).__name__}")
-            self.log_error(f"  错误详情: {str(e)}")
-
-            error_response = f"抱歉，我在处理您的请求时遇到了错误: {str(e)}"
+            self.log_error(f"  错误详情: {error_text}")
 
             return {
                 'success': False,
-                'error': str(e),
-                'response': error_response
+                'error': error_text,
+                'response': f"抱歉，我在处理您的请求时遇到了错误: {error_text}"
             }
         finally:
             if self.status != AgentStatus.ERROR:
                 self._change_status(AgentStatus.IDLE)
                 self.log_info(f"🔄 Agent {self.name} 状态重置为空闲")
     
+    @classmethod
+    async def think_many(cls, pairs: List[Tuple['Agent', Dict[str, Any]]], concurrency: int = 16) -> List[Dict[str, Any]]:
+        """
+        并发执行多个Agent的思考过程
+
+        协调者场景下各Agent的模型调用互不依赖，并发执行后总耗时接近单次调用，
+        信号量限制同时进行的模型调用数，避免触发服务商限流。
+
+        Args:
+            pairs: (Agent, 输入数据) 列表，同一个Agent不应在列表中出现多次
+            concurrency: 最大并发数
+
+        Returns:
+            与pairs顺序一致的思考结果列表
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(agent: 'Agent', input_data: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                return await agent.think(input_data)
+
+        return await asyncio.gather(*(run(agent, input_data) for agent, input_data in pairs))
+    
+    async def _generate_streamed(self, prompt: str, context: Optional[StructuredContext],
+                                 system_prompt: Optional[str], chunks: List[str]) -> str:
+        """
+        以流式方式调用模型，每个片段到达时立即交给on_response_chunk回调
+        
+        工具调用短语之后紧跟着调用参数，因此检测到短语时不会提前中断生成，
+        完整响应拼接后仍由_parse_response统一解析。已送出的片段记录在chunks中，
+        调用方据此判断失败后能否重试。
+        """
+        async for chunk in self.model.generate_stream(prompt, context, system=system_prompt):
+            chunks.append(chunk)
+            if self.on_response_chunk:
+                await self.on_response_chunk(chunk)
+        return "".join(chunks)
+    
+    def _build_context(self, user_input: str) -> Optional[StructuredContext]:
+        """
+        为本轮输入构建结构化上下文
+        
+        写入用户输入和构建上下文在同一处完成，构建失败时返回None，由模型层退化为简单上下文。
+        """
+        if not self.context_manager:
+            return None
+        
+        try:
+            # 设置用户输入到上下文管理器
+            self.context_manager.set_user_input(user_input)
+            # 构建简化的上下文
+            context = self.context_manager.build_structured_context(user_input)
+            self.log_debug("Context building successful")
+            return context
+        except Exception as ctx_error:
+            self.log_warning(f"Context building failed, using simple context: {ctx_error}")
+            return None
+    
+    def _response_cache_key(self, system_prompt: Optional[str], prompt: str,
+                            context: Optional[StructuredContext] = None) -> str:
+        """计算响应缓存键：角色、系统提示词哈希、上下文哈希、本轮消息哈希组合后再取哈希"""
+        system_hash = hashlib.blake2b((system_prompt or "").encode('utf-8'), digest_size=16).hexdigest()
+        context_hash = self._context_fingerprint(context)
+        prompt_hash = hashlib.blake2b(prompt.encode('utf-8'), digest_size=16).hexdigest()
+        return hashlib.blake2b(
+            f"{self._role_str}:{system_hash}:{context_hash}:{prompt_hash}".encode('utf-8'), digest_size=16
+        ).hexdigest()
+    
+    def _context_fingerprint(self, context: Optional[StructuredContext]) -> str:
+        """对模型层实际会用到的上下文字段取哈希，上下文不同的请求不会命中同一条缓存"""
+        if context is None:
+            return ""
+        
+        payload = json.dumps([
+            context.user_input,
+            context.developer_instructions,
+            context.conversation_history,
+            context.tool_results,
+            context.external_data
+        ], ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def _lookup_cached_response(self, cache_key: str) -> Optional[str]:
+        """查找缓存的响应，命中时刷新其LRU位置"""
+        response = self._response_cache.get(cache_key)
+        if response is not None:
+            self._response_cache.move_to_end(cache_key)
+        return response
+    
+    def _store_cached_response(self, cache_key: str, response: str) -> None:
+        """缓存成功的模型响应，超出容量时淘汰最久未使用的条目"""
+        self._response_cache[cache_key] = response
+        self._response_cache.move_to_end(cache_key)
+        while len(self._response_cache) > self.response_cache_size:
+            self._response_cache.popitem(last=False)
+    
     def _parse_response(self, response: str) -> Dict[str, Any]:
         """
         解析模型响应
@@ -371,7 +659,7 @@ class Agent(FlowNode):
         }
         
         # 简单的工具调用检测
-        if "调用工具" in response or "使用工具" in response:
+        if self._TOOL_TRIGGER_RE.search(response):
             # 这里可以实现更复杂的工具调用解析逻辑
             pass
         
@@ -386,7 +674,16 @@ class Agent(FlowNode):
                 raise ValueError(f"Unknown tool: {tool_name}")
             
             tool_func = self.available_tools[tool_name]
-            result = await tool_func(**tool_args) if asyncio.iscoroutinefunction(tool_func) else tool_func(**tool_args)
+            if getattr(tool_func, 'batch', None) is not None:
+                # 经batchable标记的工具：与其他并发调用合并后批量执行
+                result = await _tool_dispatcher.submit(tool_func, tool_args)
+            elif asyncio.iscoroutinefunction(tool_func):
+                result = await tool_func(**tool_args)
+            else:
+                # 同步工具放到线程中执行（指定了专用线程池时用专用池，否则用默认线程池），避免阻塞事件循环上的其他Agent
+                loop = asyncio.get_running_loop()
+                executor = self.tool_executors.get(tool_name)
+                result = await loop.run_in_executor(executor, functools.partial(tool_func, **tool_args))
             
             # 将工具结果添加到上下文
             self.context_manager.add_tool_result(tool_name, result)
@@ -411,26 +708,66 @@ class Agent(FlowNode):
         Returns:
             执行结果
         """
-        # 同步包装异步think方法
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        # 同步包装异步think方法：提交到共用的后台事件循环，
+        # 不再为每次调用创建并关闭新的事件循环，也不会替换调用方线程的当前循环。
+        # 调用方自身处于其他事件循环中时同样提交到后台循环，不会与调用方的循环冲突。
         try:
-            result = loop.run_until_complete(self.think(input_data))
-            return result
-        finally:
-            loop.close()
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        
+        agent_loop = _get_background_loop()
+        if running_loop is agent_loop:
+            # 在后台循环内部同步等待自身提交的任务会永久阻塞
+            raise RuntimeError(
+                f"Agent {self.name}: _execute_core cannot be called from the agent event loop, await think() instead"
+            )
+        
+        future = asyncio.run_coroutine_threadsafe(self.think(input_data), agent_loop)
+        return future.result()
+    
+    def _append_history(self, entry: Dict[str, Any]) -> None:
+        """追加对话历史，窗口已满时先把即将被挤出的最旧条目交给_archive_overflow"""
+        if len(self.conversation_history) == self.history_limit:
+            self._archive_overflow(self.conversation_history[0])
+        self.conversation_history.append(entry)
+        self._recent_turns.append(entry)
+    
+    def _archive_overflow(self, entry: Dict[str, Any]) -> None:
+        """
+        处理滑出窗口的对话历史条目
+        
+        think产生的每一轮对话都已通过add_conversation_turn写入上下文管理器，
+        配置了history_spill_path时追加写入该文件，否则只记录日志；
+        需要其他外部存储的子类可以覆盖此方法。
+        """
+        if self._is_log_enabled(logging.DEBUG):
+            self.log_debug("Conversation history window full, evicting oldest entry", {
+                'role': entry.get('role'),
+                'history_limit': self.history_limit
+            })
+
+        if not self.history_spill_path:
+            return
+
+        try:
+            # 窗口满后每轮都会溢出，复用同一个行缓冲的追加句柄，不在事件循环上反复打开、关闭文件
+            if self._spill_file is None:
+                self._spill_file = open(self.history_spill_path, 'a', encoding='utf-8', buffering=1)
+            self._spill_file.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+        except OSError as spill_error:
+            self.log_warning(f"Failed to spill conversation history to {self.history_spill_path}: {spill_error}")
     
     def get_conversation_summary(self) -> str:
         """获取对话摘要"""
         if not self.conversation_history:
             return "暂无对话历史"
         
-        summary_lines = [f"Agent: {self.name} ({self.role.value})"]
-        summary_lines.append(f"对话轮数: {len(self.conversation_history) // 2}")
+        summary_lines = [f"Agent: {self.name} ({self._role_str})"]
+        summary_lines.append(f"对话轮数: {self._turn_count}")
         
         # 获取最近的几轮对话
-        recent_turns = self.conversation_history[-6:]  # 最近3轮
-        for entry in recent_turns:
+        for entry in self._recent_turns:  # 最近3轮
             role = "用户" if entry['role'] == 'user' else self.name
             content_preview = entry['content'][:50] + "..." if len(entry['content']) > 50 else entry['content']
             summary_lines.append(f"{role}: {content_preview}")
@@ -440,21 +777,34 @@ class Agent(FlowNode):
     def reset(self) -> None:
         """重置Agent状态"""
         self.status = AgentStatus.IDLE
-        self.message_queue.clear()
+        self._status_str = AgentStatus.IDLE.value
+        while not self.message_queue.empty():
+            self.message_queue.get_nowait()
+            self.message_queue.task_done()
         self.conversation_history.clear()
+        self._recent_turns.clear()
+        self._turn_count = 0
+        self._response_cache.clear()
         self.context_manager.clear_session_data()
         
         self.log_info(f"Agent {self.name} reset")
     
+    def close(self) -> None:
+        """释放Agent持有的资源（历史落盘文件句柄）"""
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+    
     def get_metadata(self) -> Dict[str, Any]:
         """获取Agent元数据 - 标准接口方法"""
         base_metadata = {
             'name': self.name,
-            'role': self.role.value,
-            'status': self.status.value,
+            'role': self._role_str,
+            'status': self._status_str,
             'description': self.metadata.description,
-            'capabilities': self.metadata.capabilities.copy(),
-            'constraints': self.metadata.constraints.copy()
+            # 只读快照：元组不可变，调用方无需再做防御性复制
+            'capabilities': tuple(self.metadata.capabilities),
+            'constraints': tuple(self.metadata.constraints)
         }
         
         # 合并自定义属性
@@ -467,8 +817,8 @@ class Agent(FlowNode):
         return {
             'id': self.component_id,
             'name': self.name,
-            'role': self.role.value,
-            'status': self.status.value,
+            'role': self._role_str,
+            'status': self._status_str,
             'metadata': {
                 'description': self.metadata.description,
                 'capabilities': self.metadata.capabilities,
@@ -476,56 +826,71 @@ class Agent(FlowNode):
                 'custom_attributes': self.metadata.custom_attributes
             },
             'tools': list(self.available_tools.keys()),
-            'conversation_turns': len(self.conversation_history) // 2,
+            'conversation_turns': self._turn_count,
             'connected_agents': list(self.other_agents.keys())
         }
     
-    def _build_discussion_prompt(self, user_input: str, room_context: Dict[str, Any]) -> str:
-        """构建多Agent讨论模式的提示词"""
+    def _get_static_prefix(self, system_prompt: Optional[str], persona_block: str) -> str:
+        """
+        拼接讨论模式的静态前缀（系统提示词 + 讨论设定）
+        
+        两部分在同一房间内通常保持不变，命中时直接返回上次拼接的文本，不再重复构建长字符串。
+        系统提示词每次仍从prompt_manager读取，外部修改后会自动生效。
+        """
+        key = (system_prompt, persona_block)
+        memo = self._static_prefix_memo
+        if memo is not None and memo[0] == key:
+            return memo[1]
+        
+        prefix = f"{system_prompt}\n\n{persona_block}" if system_prompt else persona_block
+        self._static_prefix_memo = (key, prefix)
+        return prefix
+    
+    def _build_discussion_prompt(self, user_input: str, room_context: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        构建多Agent讨论模式的提示词
+
+        Returns:
+            (persona_block, volatile_tail) - 前者只包含稳定的讨论设定和排序后的Agent列表，
+            可作为可缓存的前缀；后者包含最近的对话和用户问题，每轮都会变化
+        """
         available_agents = room_context.get('available_agents', [])
         message_history = room_context.get('message_history', [])
 
-        # 获取基础系统提示词
-        base_prompt = ""
-        if self.prompt_manager:
-            try:
-                base_prompt = self.prompt_manager.get_system_prompt() or ""
-            except Exception:
-                pass
-
-        # 构建讨论上下文
-        discussion_context = []
-        if message_history:
-            discussion_context.append("=== 对话历史 ===")
-            for msg in message_history[-3:]:  # 最近3条消息
-                sender = msg.get('sender_id', 'unknown')
-                content = msg.get('content', '')
-                discussion_context.append(f"{sender}: {content}")
-
-        # 构建讨论提示词
-        prompt_parts = []
-
-        if base_prompt:
-            prompt_parts.append(f"系统提示: {base_prompt}")
-
-        prompt_parts.append(f"""
-多Agent讨论模式：
-- 当前参与讨论的Agent: {', '.join(available_agents)}
+        # 稳定前缀：Agent列表排序后输出，名单顺序变化不会使前缀失效；同一名单只构建一次
+        roster = tuple(sorted(available_agents))
+        cache_key = (self.name,) + roster
+        cached = self._persona_block_cache.get(cache_key)
+        if cached is None:
+            persona_block = f"""多Agent讨论模式：
+- 当前参与讨论的Agent: {', '.join(roster)}
 - 你的名字是: {self.name}
 - 这是一个多Agent讨论，你需要：
   1. 基于用户问题和其他Agent的观点提供你的见解
   2. 可以同意、补充或礼貌地反驳其他Agent的观点
   3. 保持讨论的建设性和专业性
-  4. 如果你认为问题已经得到充分讨论，可以总结观点
-""")
+  4. 如果你认为问题已经得到充分讨论，可以总结观点"""
+            pack_version = hashlib.md5(persona_block.encode('utf-8')).hexdigest()[:12]
+            cached = self._persona_block_cache[cache_key] = (persona_block, pack_version)
+        persona_block, pack_version = cached
 
-        if discussion_context:
-            prompt_parts.extend(discussion_context)
+        if pack_version != self.persona_pack_version:
+            self.persona_pack_version = pack_version
+            self.log_debug(f"Discussion persona pack updated: {pack_version}")
+
+        # 易变后缀：最近的对话和用户问题
+        tail_parts = []
+        if message_history:
+            tail_parts.append("=== 对话历史 ===")
+            for msg in message_history[-3:]:  # 最近3条消息
+                sender = msg.get('sender_id', 'unknown')
+                content = msg.get('content', '')
+                tail_parts.append(f"{sender}: {content}")
 
-        prompt_parts.append(f"\n用户问题: {user_input}")
-        prompt_parts.append(f"\n请以{self.name}的身份参与讨论:")
+        tail_parts.append(f"\n用户问题: {user_input}")
+        tail_parts.append(f"\n请以{self.name}的身份参与讨论:")
 
-        return "\n".join(prompt_parts)
+        return persona_block, "\n".join(tail_parts)
 
     def __repr__(self) -> str:
-        return f"Agent(id={self.component_id}, name={self.name}, role={self.role.value}, status={self.status.value})"
+        return f"Agent(id={self.component_id}, name={self.name}, role={self._role_str}, status={self._status_str})"
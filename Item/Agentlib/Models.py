@@ -4,15 +4,136 @@ Models - 大模型调用模块
 """
 
 import asyncio
+import hashlib
 import json
+import logging
+import math
+import random
+import sys
+import threading
 import time
+import weakref
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Optional, Union
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Union, Tuple, Callable, Sequence
 from dataclasses import dataclass, field
 
 from ..FlowTools.base_component import BaseComponent
 from ..ContextEngineer.context_manager import StructuredContext
 
+# 可选的平台SDK，模块加载时导入一次；未安装时对应模型退化为兼容接口或模拟响应
+try:
+    import openai
+except ImportError:
+    openai = None
+
+try:
+    from zhipuai import ZhipuAI
+except ImportError:
+    ZhipuAI = None
+
+# 可选的orjson，缓存键序列化更快；未安装时使用标准库json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 可选的tiktoken，用于本地计算token数；未安装或模型不受支持时按字符估算
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# dataclass的slots参数需要Python 3.10+，低版本退化为普通dataclass；Agentlib各模块共用
+_DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+
+# 同步执行入口（ModelBase.execute、Agent._execute_core）共用的后台事件循环，首次使用时创建。
+# 异步客户端按事件循环分别缓存，同步入口共用同一个循环才能在多次调用之间保持连接复用。
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop_lock = threading.Lock()
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    """获取共用的后台事件循环，循环在守护线程中常驻运行"""
+    global _background_loop
+    if _background_loop is None:
+        with _background_loop_lock:
+            if _background_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="agent-event-loop", daemon=True).start()
+                _background_loop = loop
+    return _background_loop
+
+
+# 进程内共享的异步OpenAI客户端：事件循环 -> {(api_base, api_key, timeout) -> 客户端}。
+# httpx连接池绑定在创建连接的事件循环上，不能跨循环使用，因此按当前运行的循环分别建池；
+# 同一循环内指向同一端点的多个模型实例共用一个连接池，连接复用率更高，占用的文件描述符更少。
+_openai_client_pool: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[Optional[str], str, float], Any]]" = \
+    weakref.WeakKeyDictionary()
+_openai_client_pool_lock = threading.Lock()
+
+
+def _get_pooled_openai_client(api_base: Optional[str], api_key: str, timeout: float):
+    """
+    获取（必要时创建）当前事件循环中指定端点和密钥共用的异步OpenAI客户端
+    
+    必须在协程内调用；SDK未安装时抛出ImportError。
+    """
+    if openai is None:
+        raise ImportError("openai SDK not installed")
+    
+    loop = asyncio.get_running_loop()
+    pool_key = (api_base, api_key, timeout)
+    with _openai_client_pool_lock:
+        # 已关闭的循环无法再执行aclose，直接丢弃其客户端引用，由垃圾回收释放连接；
+        # 循环对象本身被回收时，WeakKeyDictionary会自动移除对应条目
+        for closed_loop in [l for l in _openai_client_pool.keys() if l.is_closed()]:
+            del _openai_client_pool[closed_loop]
+        
+        loop_clients = _openai_client_pool.setdefault(loop, {})
+        client = loop_clients.get(pool_key)
+        if client is None:
+            client = openai.AsyncOpenAI(api_key=api_key, base_url=api_base, timeout=timeout)
+            loop_clients[pool_key] = client
+    return client
+
+
+async def close_pooled_openai_clients() -> None:
+    """关闭当前事件循环中缓存的全部异步OpenAI客户端，应在循环结束前（如asyncio.run的主协程末尾）调用"""
+    with _openai_client_pool_lock:
+        loop_clients = _openai_client_pool.pop(asyncio.get_running_loop(), {})
+    for client in loop_clients.values():
+        await client.close()
+
+
+# 错误信息中出现以下关键词时视为临时性故障
+_RETRYABLE_KEYWORDS = ('timeout', 'timed out', 'connection', 'network', 'temporary', 'rate limit', 'overloaded')
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """判断模型调用错误是否值得重试：超时、连接错误、限流(429)和服务端错误(5xx)，ModelBase和Agent的重试共用"""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    
+    status_code = getattr(error, 'status_code', None)
+    if isinstance(status_code, int):
+        return status_code == 429 or 500 <= status_code < 600
+    
+    error_msg = str(error).lower()
+    return any(keyword in error_msg for keyword in _RETRYABLE_KEYWORDS)
+
+
+class _LogLevelMixin:
+    """日志级别判断的公共实现，ModelBase、Agent和BaseTool共用"""
+    
+    __slots__ = ()
+    
+    def _is_log_enabled(self, level: int) -> bool:
+        """判断日志级别是否启用，用于跳过开销较大的日志内容构建"""
+        logger = getattr(self, 'logger', None)
+        return logger.isEnabledFor(level) if logger is not None else True
+
 
 @dataclass
 class ModelConfig:
@@ -28,6 +149,9 @@ class ModelConfig:
     timeout: int = 60
     retry_times: int = 3
     custom_params: Dict[str, Any] = field(default_factory=dict)
+    # 响应缓存：开启后（或temperature为0时）完全相同的请求直接复用上次的响应
+    cache_responses: bool = False
+    cache_size: int = 256
 
 
 @dataclass
@@ -40,14 +164,143 @@ class ModelResponse:
     metadata: Dict[str, Any] = field(default_factory=dict)
 
 
-class ModelBase(BaseComponent, ABC):
+class LLMCache:
+    """模型响应缓存 - 进程内LRU，按请求内容（模型、消息、采样参数）精确匹配"""
+    
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, ModelResponse]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def make_key(model_name: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+        """生成缓存键：请求内容序列化后取哈希（缓存键不涉及安全，使用更快的blake2b）"""
+        request = {'model': model_name, 'messages': messages, 'params': params}
+        if orjson is not None:
+            payload = orjson.dumps(request, option=orjson.OPT_SORT_KEYS, default=str)
+        else:
+            payload = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')
+        return hashlib.blake2b(payload, digest_size=32).hexdigest()
+    
+    def get(self, key: str) -> Optional[ModelResponse]:
+        """查找缓存，命中时把条目移到最近使用的位置"""
+        response = self._entries.get(key)
+        if response is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return response
+    
+    def set(self, key: str, response: ModelResponse) -> None:
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        self._entries[key] = response
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+    
+    def clear(self) -> None:
+        """清空缓存"""
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SemanticCache:
+    """
+    语义缓存 - 按请求文本向量的余弦相似度匹配近似重复的请求
+    
+    向量化函数由调用方提供（如本地sentence-transformers模型的encode），本模块不绑定具体的嵌入模型。
+    安装了numpy时相似度用一次矩阵乘法算出，否则逐条计算。
+    """
+    
+    def __init__(self, embed_func: Callable[[str], Sequence[float]],
+                 threshold: float = 0.92, max_entries: int = 1024):
+        self.embed_func = embed_func
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._vectors: List[List[float]] = []
+        self._responses: List[ModelResponse] = []
+        # numpy矩阵按需重建，条目变化后置为None
+        self._matrix = None
+        self.hits = 0
+        self.misses = 0
+    
+    def embed(self, text: str) -> List[float]:
+        """计算文本的单位向量"""
+        vector = [float(value) for value in self.embed_func(text)]
+        norm = math.sqrt(sum(value * value for value in vector))
+        return [value / norm for value in vector] if norm else vector
+    
+    def get(self, vector: List[float]) -> Optional[ModelResponse]:
+        """查找与给定向量最相似的缓存响应，相似度低于阈值时返回None"""
+        best_index, best_score = -1, -1.0
+        if self._vectors:
+            try:
+                import numpy as np
+                
+                if self._matrix is None:
+                    self._matrix = np.asarray(self._vectors, dtype=np.float32)
+                scores = self._matrix @ np.asarray(vector, dtype=np.float32)
+                best_index = int(scores.argmax())
+                best_score = float(scores[best_index])
+            except ImportError:
+                for index, cached_vector in enumerate(self._vectors):
+                    score = sum(a * b for a, b in zip(cached_vector, vector))
+                    if score > best_score:
+                        best_index, best_score = index, score
+        
+        if best_score >= self.threshold:
+            self.hits += 1
+            return self._responses[best_index]
+        self.misses += 1
+        return None
+    
+    def set(self, vector: List[float], response: ModelResponse) -> None:
+        """写入缓存，超出容量时淘汰最早写入的条目"""
+        self._vectors.append(vector)
+        self._responses.append(response)
+        if len(self._vectors) > self.max_entries:
+            del self._vectors[0]
+            del self._responses[0]
+        self._matrix = None
+    
+    def clear(self) -> None:
+        """清空缓存"""
+        self._vectors.clear()
+        self._responses.clear()
+        self._matrix = None
+    
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+
+class ModelBase(_LogLevelMixin, BaseComponent, ABC):
     """模型基类 - 定义统一的模型调用接口"""
     
+    # 重试退避的下限和上限（秒）
+    RETRY_BASE_DELAY = 1.0
+    RETRY_MAX_DELAY = 30.0
+    
     def __init__(self, model_id: str, config: ModelConfig):
         super().__init__(model_id, "model")
         self.config = config
         self.call_count = 0
         self.total_tokens = 0
+        # 精确匹配的响应缓存
+        self.response_cache = LLMCache(config.cache_size)
+        # 语义缓存，需要时由调用方挂载SemanticCache实例
+        self.semantic_cache: Optional[SemanticCache] = None
+        # tiktoken编码器，首次计数时按模型名解析；False表示该模型不受支持
+        self._token_encoder = None
+        # 进行中的可缓存请求：缓存键 -> 请求任务，相同请求并发到达时共享同一次上游调用
+        self._inflight_requests: Dict[str, asyncio.Task] = {}
+        # 最近一次转换的对话历史：(历史列表, 长度, 最后一轮, 消息列表)
+        self._history_messages_memo: Optional[Tuple[Any, int, Any, List[Dict[str, str]]]] = None
+        # 最近一次拼接好的系统消息：(系统提示词, 开发者指令) -> 内容
+        self._system_content_memo: Optional[Tuple[Tuple[Optional[str], Tuple[str, ...]], str]] = None
         
         self.log_debug(f"Model initialized: {config.model_name}")
     
@@ -65,39 +318,81 @@ class ModelBase(BaseComponent, ABC):
         """
         pass
     
-    def _format_context_to_messages(self, prompt: str, context: Optional[StructuredContext] = None) -> List[Dict[str, str]]:
+    def count_text_tokens(self, text: str) -> int:
+        """
+        本地计算文本的token数
+        
+        模型受tiktoken支持时精确计数（tiktoken首次加载编码时可能需要下载BPE文件，之后使用本地缓存）；
+        否则（如智谱、未安装tiktoken、离线无法加载编码）按字符估算：
+        中日韩字符约每字1个token，其他字符约每4个1个token。
+        """
+        if self._token_encoder is None:
+            self._token_encoder = False
+            if tiktoken is not None:
+                try:
+                    self._token_encoder = tiktoken.encoding_for_model(self.config.model_name)
+                except Exception as e:
+                    # 模型不受支持（KeyError）或离线时下载编码文件失败，均退化为字符估算
+                    self.log_debug(f"tiktoken encoder unavailable, falling back to estimate: {e}")
+        
+        if self._token_encoder:
+            return len(self._token_encoder.encode(text))
+        
+        cjk_chars = sum(1 for char in text if '\u4e00' <= char <= '\u9fff' or '\u3040' <= char <= '\u30ff' or '\uac00' <= char <= '\ud7af')
+        return cjk_chars + (len(text) - cjk_chars + 3) // 4
+    
+    def count_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """本地计算消息列表的token数，可用于调用前的预算检查"""
+        return sum(self.count_text_tokens(msg['content']) for msg in messages)
+    
+    def _simulated_usage(self, messages: List[Dict[str, str]], response_content: str) -> Dict[str, int]:
+        """估算模拟响应的用量，消息的token数只统计一次"""
+        prompt_tokens = self.count_tokens(messages)
+        completion_tokens = self.count_text_tokens(response_content)
+        return {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens
+        }
+    
+    def _get_openai_client(self):
+        """
+        获取当前事件循环中本模型复用的异步OpenAI客户端，必须在协程内调用
+        
+        客户端内部持有httpx连接池，跨请求复用可以保持keep-alive，避免每次请求重新进行TCP/TLS握手；
+        连接池绑定在事件循环上，因此不在实例上缓存，每次从按循环划分的进程级客户端池中取得，
+        同一循环内端点和密钥相同的模型实例共用同一个客户端。SDK未安装时抛出ImportError，由调用方降级处理。
+        """
+        return _get_pooled_openai_client(self.config.api_base, self.config.api_key, self.config.timeout)
+    
+    def _format_context_to_messages(self, prompt: str, context: Optional[StructuredContext] = None,
+                                    system: Optional[str] = None) -> List[Dict[str, str]]:
         """
         将上下文格式化为消息列表
         
+        服务商的提示词缓存按前缀精确匹配，消息按变化频率从低到高排列：
+        1. 系统消息：系统提示词 + 开发者指令，只包含稳定内容
+        2. 历史对话：只在末尾追加，上一轮的消息仍是本轮的前缀
+        3. 工具结果、检索记忆：每轮都可能变化，单独成段放在历史之后
+        4. 本轮用户消息
+        
         Args:
-            prompt: 主提示词
+            prompt: 本轮的用户消息
             context: 结构化上下文
+            system: 持久化的系统提示词（放在消息最前面，便于服务商的前缀缓存命中）
             
         Returns:
             消息列表
         """
         messages = []
         
-        # 添加系统消息
-        system_content = "你是一个智能助手。"
-        
-        if context:
-            # 添加开发者指令
-            if context.developer_instructions:
-                system_content += "\n\n开发者指令：\n" + "\n".join(context.developer_instructions)
-            
-            # 开发者指令已在上面处理
-            # 如果需要额外的系统信息，可以通过metadata或其他方式传递
-        
-        messages.append({"role": "system", "content": system_content})
+        # 添加系统消息 - 只放稳定内容，易变的工具结果和记忆不混入其中
+        developer_instructions = tuple(context.developer_instructions) if context and context.developer_instructions else ()
+        messages.append({"role": "system", "content": self._get_system_content(system, developer_instructions)})
         
         # 添加历史对话
         if context and context.conversation_history:
-            for turn in context.conversation_history:
-                if 'user' in turn:
-                    messages.append({"role": "user", "content": turn['user']})
-                if 'assistant' in turn:
-                    messages.append({"role": "assistant", "content": turn['assistant']})
+            messages.extend(self._format_history_messages(context.conversation_history))
         
         # 添加工具结果
         if context and context.tool_results:
@@ -108,35 +403,81 @@ class ModelBase(BaseComponent, ABC):
         
         # 添加检索到的记忆
         if context and context.external_data:
-            memory_info = "相关记忆：\n"
-            for data in context.external_data:
-                memory_info += f"- {data['content']}\n"
+            memory_info, memory_version = self._build_memory_pack(context.external_data)
+            if self._is_log_enabled(logging.DEBUG):
+                self.log_debug(f"Memory pack version: {memory_version}")
             messages.append({"role": "system", "content": memory_info})
         
-        # 添加当前用户输入
-        if context and context.user_input:
-            messages.append({"role": "user", "content": context.user_input})
-        else:
-            # 如果没有上下文，直接使用prompt作为用户输入
+        # 添加本轮用户消息：调用方传入的prompt优先（讨论模式下包含最近对话），
+        # prompt为空时才退回上下文中的原始用户输入
+        if prompt:
             messages.append({"role": "user", "content": prompt})
+        else:
+            messages.append({"role": "user", "content": context.user_input if context else ""})
         
         return messages
     
-    async def generate(self, prompt: str, context: Optional[StructuredContext] = None, **kwargs) -> str:
+    def _format_history_messages(self, history: List[Dict[str, Any]]) -> List[Dict[str, str]]:
         """
-        生成响应
+        将对话历史转换为消息列表
         
-        Args:
-            prompt: 提示词
-            context: 结构化上下文
-            **kwargs: 额外参数
-            
-        Returns:
-            生成的文本
+        上下文管理器复用同一个历史列表时，上次转换的结果按（列表对象, 长度, 最后一轮）记住：
+        历史未变化时直接复用，只在末尾追加了新轮次时只转换新增部分；其他情况重新转换。
+        """
+        memo = self._history_messages_memo
+        start = 0
+        history_messages: List[Dict[str, str]] = []
+        if memo is not None and memo[0] is history:
+            _, memo_length, memo_last_turn, memo_messages = memo
+            if 0 < memo_length <= len(history) and history[memo_length - 1] is memo_last_turn:
+                start = memo_length
+                history_messages = list(memo_messages)
+        
+        for index in range(start, len(history)):
+            turn = history[index]
+            if 'user' in turn:
+                history_messages.append({"role": "user", "content": turn['user']})
+            if 'assistant' in turn:
+                history_messages.append({"role": "assistant", "content": turn['assistant']})
+        
+        self._history_messages_memo = (history, len(history), history[-1], history_messages)
+        return history_messages
+    
+    def _get_system_content(self, system: Optional[str], developer_instructions: Tuple[str, ...]) -> str:
         """
-        messages = self._format_context_to_messages(prompt, context)
+        拼接系统消息内容（系统提示词 + 开发者指令）
         
-        # 合并配置参数
+        两者很少变化，最近一次的拼接结果按输入缓存，输入不变时直接复用同一个字符串。
+        """
+        memo_key = (system, developer_instructions)
+        if self._system_content_memo is not None and self._system_content_memo[0] == memo_key:
+            return self._system_content_memo[1]
+        
+        parts = [system or "你是一个智能助手。"]
+        if developer_instructions:
+            # 添加开发者指令
+            parts.append("开发者指令：\n" + "\n".join(developer_instructions))
+        system_content = "\n\n".join(parts)
+        
+        self._system_content_memo = (memo_key, system_content)
+        return system_content
+    
+    def _build_memory_pack(self, external_data: List[Dict[str, Any]]) -> Tuple[str, str]:
+        """
+        构建检索记忆块
+        
+        条目按id（没有id时按内容）排序后输出，检索顺序不同但内容相同的记忆会渲染成完全一致的文本，
+        不会无谓地打破服务商的提示词缓存。
+        
+        Returns:
+            (记忆文本, 版本号) - 版本号是文本的哈希，用于观察记忆块是否变化
+        """
+        entries = sorted(external_data, key=lambda data: (str(data.get('id', '')), data['content']))
+        memory_info = "相关记忆：\n" + "".join(f"- {data['content']}\n" for data in entries)
+        return memory_info, hashlib.md5(memory_info.encode('utf-8')).hexdigest()[:8]
+    
+    def _merge_call_params(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """合并配置中的采样参数和本次调用传入的参数"""
         call_params = {
             'temperature': self.config.temperature,
             'max_tokens': self.config.max_tokens,
@@ -145,23 +486,123 @@ class ModelBase(BaseComponent, ABC):
             'presence_penalty': self.config.presence_penalty,
         }
         call_params.update(kwargs)
+        return call_params
+    
+    def _call_api_stream(self, messages: List[Dict[str, str]], **kwargs):
+        """
+        以流式方式调用具体的API
+        
+        Args:
+            messages: 消息列表
+            **kwargs: 额外参数
+            
+        Returns:
+            逐个产出文本片段的异步迭代器；平台不支持原生流式时返回None，由generate_stream退化处理
+        """
+        return None
+    
+    async def _stream_chat_completion(self, client, request_params: Dict[str, Any]):
+        """消费OpenAI兼容接口的SSE流，逐个产出增量文本"""
+        stream = await client.chat.completions.create(stream=True, **request_params)
+        async for chunk in stream:
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+    
+    async def generate(self, prompt: str, context: Optional[StructuredContext] = None,
+                       system: Optional[str] = None, **kwargs) -> str:
+        """
+        生成响应
+        
+        Args:
+            prompt: 提示词（本轮的用户消息）
+            context: 结构化上下文
+            system: 系统提示词，与用户消息分开传递以复用服务商的提示词缓存
+            **kwargs: 额外参数
+            
+        Returns:
+            生成的文本
+        """
+        messages = self._format_context_to_messages(prompt, context, system)
+        call_params = self._merge_call_params(kwargs)
+        
+        # 确定性请求（temperature为0）或显式开启缓存时，先查响应缓存
+        if not (self.config.cache_responses or call_params.get('temperature') == 0):
+            return await self._generate_uncached(messages, call_params, None)
+        
+        cache_key = LLMCache.make_key(self.config.model_name, messages, call_params)
+        cached_response = self.response_cache.get(cache_key)
+        if cached_response is not None:
+            self.log_debug("Model response cache hit")
+            return cached_response.content
+        
+        # 相同请求正在进行时直接等待其结果，不再重复请求上游；
+        # shield保证某个等待方被取消时不会取消其他等待方共享的请求
+        loop = asyncio.get_running_loop()
+        task = self._inflight_requests.get(cache_key)
+        if task is None or task.get_loop() is not loop:
+            task = loop.create_task(self._generate_uncached(messages, call_params, cache_key))
+            self._inflight_requests[cache_key] = task
+            task.add_done_callback(lambda done: self._finish_inflight_request(cache_key, done))
+        else:
+            self.log_debug("Joining in-flight identical model request")
+        return await asyncio.shield(task)
+    
+    def _finish_inflight_request(self, cache_key: str, task: asyncio.Task) -> None:
+        """请求结束后移出进行中列表"""
+        if self._inflight_requests.get(cache_key) is task:
+            del self._inflight_requests[cache_key]
+    
+    async def _generate_uncached(self, messages: List[Dict[str, str]], call_params: Dict[str, Any],
+                                 cache_key: Optional[str]) -> str:
+        """
+        缓存未命中时调用API（带重试），成功的响应写入缓存
+        
+        Args:
+            messages: 消息列表
+            call_params: 合并后的调用参数
+            cache_key: 响应缓存键，None表示本次请求不使用缓存
+            
+        Returns:
+            生成的文本
+        """
+        # 精确匹配未命中时再查语义缓存，向量化可能较慢，放到线程中执行
+        semantic_vector = None
+        if cache_key and self.semantic_cache is not None:
+            cache_text = "\n".join(message['content'] for message in messages)
+            loop = asyncio.get_running_loop()
+            semantic_vector = await loop.run_in_executor(None, self.semantic_cache.embed, cache_text)
+            cached_response = self.semantic_cache.get(semantic_vector)
+            if cached_response is not None:
+                self.log_debug("Model semantic cache hit")
+                return cached_response.content
         
         # 重试机制
         last_error = None
+        retry_delay = self.RETRY_BASE_DELAY
         for attempt in range(self.config.retry_times):
             try:
-                self.log_debug(f"Calling model API (attempt {attempt + 1}/{self.config.retry_times})")
+                if self._is_log_enabled(logging.DEBUG):
+                    self.log_debug(f"Calling model API (attempt {attempt + 1}/{self.config.retry_times})")
                 
                 response = await self._call_api(messages, **call_params)
                 
                 self.call_count += 1
                 self.total_tokens += response.usage.get('total_tokens', 0)
                 
-                self.log_info(f"Model response received", {
-                    'model': response.model,
-                    'tokens': response.usage,
-                    'finish_reason': response.finish_reason
-                })
+                # 模拟响应不写入缓存，SDK可用后能立即拿到真实结果
+                if cache_key and not response.metadata.get('simulated'):
+                    self.response_cache.set(cache_key, response)
+                    if semantic_vector is not None:
+                        self.semantic_cache.set(semantic_vector, response)
+                
+                if self._is_log_enabled(logging.INFO):
+                    self.log_info("Model response received", {
+                        'model': response.model,
+                        'tokens': response.usage,
+                        'finish_reason': response.finish_reason
+                    })
                 
                 return response.content
                 
@@ -171,34 +612,139 @@ class ModelBase(BaseComponent, ABC):
                     'error': str(e)
                 })
                 
+                # 鉴权失败、参数错误等永久性错误重试也不会成功，直接放弃
+                if not is_retryable_error(e):
+                    break
+                
                 if attempt < self.config.retry_times - 1:
-                    await asyncio.sleep(2 ** attempt)  # 指数退避
+                    # 去相关抖动退避：多个Agent同时被限流时错开重试时间，避免集中冲击上游
+                    retry_delay = min(self.RETRY_MAX_DELAY, random.uniform(self.RETRY_BASE_DELAY, retry_delay * 3))
+                    await asyncio.sleep(retry_delay)
         
         # 所有重试都失败
         self.log_error("All model API calls failed", last_error)
         raise last_error
     
-    async def generate_stream(self, prompt: str, context: Optional[StructuredContext] = None, **kwargs):
+    async def generate_stream(self, prompt: str, context: Optional[StructuredContext] = None,
+                              system: Optional[str] = None, **kwargs):
         """
         流式生成响应
         
         Args:
-            prompt: 提示词
+            prompt: 提示词（本轮的用户消息）
             context: 结构化上下文
+            system: 系统提示词
             **kwargs: 额外参数
             
         Yields:
             生成的文本片段
         """
-        # 基础实现，子类可以覆盖以支持真正的流式输出
-        response = await self.generate(prompt, context, **kwargs)
+        messages = self._format_context_to_messages(prompt, context, system)
+        call_params = self._merge_call_params(kwargs)
+        
+        stream = self._call_api_stream(messages, **call_params)
+        if stream is None:
+            # 平台不支持原生流式：完整生成（含缓存、去重和重试）后切片输出
+            response = await self.generate(prompt, context, system=system, **kwargs)
+            async for piece in self._iter_slices(response):
+                yield piece
+            return
+        
+        # 与generate一致：确定性请求或显式开启缓存时，先查响应缓存、再尝试加入相同的进行中请求
+        cache_key = None
+        if self.config.cache_responses or call_params.get('temperature') == 0:
+            cache_key = LLMCache.make_key(self.config.model_name, messages, call_params)
+            cached_response = self.response_cache.get(cache_key)
+            if cached_response is not None:
+                self.log_debug("Model response cache hit")
+                async for piece in self._iter_slices(cached_response.content):
+                    yield piece
+                return
+            
+            task = self._inflight_requests.get(cache_key)
+            if task is not None and task.get_loop() is asyncio.get_running_loop():
+                self.log_debug("Joining in-flight identical model request")
+                response = await asyncio.shield(task)
+                async for piece in self._iter_slices(response):
+                    yield piece
+                return
+        
+        # 原生流式：片段随服务商的SSE事件到达，首个片段无需等待完整响应；
+        # 只在尚未产出任何片段时重试，已产出的片段无法撤回，之后的错误直接抛给调用方
+        pieces: List[str] = []
+        retry_delay = self.RETRY_BASE_DELAY
+        for attempt in range(self.config.retry_times):
+            try:
+                if attempt > 0:
+                    stream = self._call_api_stream(messages, **call_params)
+                self.log_debug("Streaming model response")
+                async for piece in stream:
+                    pieces.append(piece)
+                    yield piece
+                break
+            except Exception as e:
+                self.log_warning(f"Model streaming call failed (attempt {attempt + 1})", {
+                    'error': str(e)
+                })
+                if pieces or not is_retryable_error(e) or attempt == self.config.retry_times - 1:
+                    raise
+                retry_delay = min(self.RETRY_MAX_DELAY, random.uniform(self.RETRY_BASE_DELAY, retry_delay * 3))
+                await asyncio.sleep(retry_delay)
+        
+        # 流式接口不返回用量，按本地计数估算后计入统计；完整响应写入缓存，供后续相同请求复用
+        response_content = "".join(pieces)
+        usage = self._simulated_usage(messages, response_content)
+        self.call_count += 1
+        self.total_tokens += usage['total_tokens']
+        if cache_key:
+            self.response_cache.set(cache_key, ModelResponse(
+                content=response_content,
+                model=self.config.model_name,
+                usage=usage,
+                metadata={'streamed': True}
+            ))
+    
+    async def _iter_slices(self, response: str):
+        """
+        把完整响应切片输出，模拟流式
         
-        # 模拟流式输出
-        words = response.split()
-        for i in range(0, len(words), 5):
-            chunk = ' '.join(words[i:i+5])
-            yield chunk
-            await asyncio.sleep(0.1)
+        按固定长度切分，片段直接拼接即可还原完整响应（中文文本没有空格可供分词）；
+        完整响应已经拿到，不再人为延迟，只让出事件循环
+        """
+        chunk_size = 20
+        for i in range(0, len(response), chunk_size):
+            yield response[i:i + chunk_size]
+            await asyncio.sleep(0)
+    
+    async def generate_batch(self, prompts: List[str], contexts: Optional[List[Optional[StructuredContext]]] = None,
+                             max_concurrency: int = 20, **kwargs) -> List[Union[str, Exception]]:
+        """
+        并发生成多个提示词的响应
+        
+        Args:
+            prompts: 提示词列表
+            contexts: 与prompts一一对应的上下文列表，None表示全部不带上下文
+            max_concurrency: 最大并发请求数
+            **kwargs: 传给每次generate的额外参数
+            
+        Returns:
+            与prompts顺序一致的结果列表，单个请求失败时对应位置是异常对象，不影响其他请求
+        """
+        if contexts is None:
+            contexts = [None] * len(prompts)
+        elif len(contexts) != len(prompts):
+            raise ValueError(f"Got {len(contexts)} contexts for {len(prompts)} prompts")
+        
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def generate_one(prompt: str, context: Optional[StructuredContext]) -> str:
+            async with semaphore:
+                return await self.generate(prompt, context, **kwargs)
+        
+        return await asyncio.gather(
+            *(generate_one(prompt, context) for prompt, context in zip(prompts, contexts)),
+            return_exceptions=True
+        )
     
     def get_statistics(self) -> Dict[str, Any]:
         """获取模型调用统计"""
@@ -206,7 +752,10 @@ class ModelBase(BaseComponent, ABC):
             'model_name': self.config.model_name,
             'call_count': self.call_count,
             'total_tokens': self.total_tokens,
-            'average_tokens': self.total_tokens / self.call_count if self.call_count > 0 else 0
+            'average_tokens': self.total_tokens / self.call_count if self.call_count > 0 else 0,
+            'cache_size': len(self.response_cache),
+            'cache_hits': self.response_cache.hits,
+            'cache_misses': self.response_cache.misses
         }
     
     def execute(self, input_data: Any) -> Any:
@@ -215,57 +764,72 @@ class ModelBase(BaseComponent, ABC):
             prompt = input_data.get('prompt', '')
             context = input_data.get('context')
             
-            # 同步包装异步方法
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+            # 同步包装异步方法：提交到共用的后台事件循环，不再每次创建并关闭新循环，
+            # 复用的客户端和连接池在多次调用之间保持有效
             try:
-                response = loop.run_until_complete(self.generate(prompt, context))
-                return {'response': response, 'success': True}
-            finally:
-                loop.close()
+                running_loop = asyncio.get_running_loop()
+            except RuntimeError:
+                running_loop = None
+            
+            background_loop = _get_background_loop()
+            if running_loop is background_loop:
+                # 在后台循环内部同步等待自身提交的任务会永久阻塞
+                raise RuntimeError("ModelBase.execute cannot be called from the background event loop, await generate() instead")
+            
+            future = asyncio.run_coroutine_threadsafe(self.generate(prompt, context), background_loop)
+            return {'response': future.result(), 'success': True}
         else:
             return {'error': 'Invalid input', 'success': False}
 
 
-class OpenAIModel(ModelBase):
-    """OpenAI模型实现"""
+class _OpenAICompatibleModel(ModelBase):
+    """OpenAI兼容接口模型的公共实现 - 子类只需提供默认配置和平台差异"""
     
-    def __init__(self, model_id: str = "openai_model", config: Optional[ModelConfig] = None):
-        if config is None:
-            config = ModelConfig(
-                model_name="gpt-3.5-turbo",
-                api_key="",  # 需要在配置中设置
-                api_base="https://api.openai.com/v1"
-            )
-        super().__init__(model_id, config)
+    # 响应元数据中的平台标识
+    API_LABEL = "openai"
+    # 日志中的平台名称
+    API_NAME = "OpenAI"
+    # 模拟响应中的模型名前缀
+    SIMULATION_PREFIX = ""
+    # 模拟响应中的配置提示
+    SIMULATION_HINT = "请安装OpenAI SDK并配置API密钥以使用真实API。"
+    # 通过OpenAI兼容接口调用时附加到响应元数据的内容
+    RESPONSE_METADATA: Dict[str, Any] = {}
+    
+    def _build_request_params(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """准备请求参数，平台特有参数由子类补充"""
+        request_params = {
+            'model': self.config.model_name,
+            'messages': messages,
+            'temperature': kwargs.get('temperature', self.config.temperature),
+            'max_tokens': kwargs.get('max_tokens', self.config.max_tokens),
+            'top_p': kwargs.get('top_p', self.config.top_p),
+        }
+        
+        # 添加自定义参数
+        request_params.update(self.config.custom_params)
+        return request_params
+    
+    def _call_api_stream(self, messages: List[Dict[str, str]], **kwargs):
+        """以流式方式调用OpenAI兼容接口，SDK未安装时返回None"""
+        try:
+            client = self._get_openai_client()
+        except ImportError:
+            return None
+        return self._stream_chat_completion(client, self._build_request_params(messages, **kwargs))
     
     async def _call_api(self, messages: List[Dict[str, str]], **kwargs) -> ModelResponse:
-        """调用OpenAI API"""
+        """调用API"""
+        return await self._call_openai_compatible_api(messages, **kwargs)
+    
+    async def _call_openai_compatible_api(self, messages: List[Dict[str, str]], **kwargs) -> ModelResponse:
+        """通过复用的异步OpenAI客户端调用兼容接口"""
         try:
-            import openai
-            
-            # 配置OpenAI客户端
-            client = openai.OpenAI(
-                api_key=self.config.api_key,
-                base_url=self.config.api_base
-            )
-            
-            # 准备请求参数
-            request_params = {
-                'model': self.config.model_name,
-                'messages': messages,
-                'temperature': kwargs.get('temperature', self.config.temperature),
-                'max_tokens': kwargs.get('max_tokens', self.config.max_tokens),
-                'top_p': kwargs.get('top_p', self.config.top_p),
-                'frequency_penalty': kwargs.get('frequency_penalty', self.config.frequency_penalty),
-                'presence_penalty': kwargs.get('presence_penalty', self.config.presence_penalty),
-            }
-            
-            # 添加自定义参数
-            request_params.update(self.config.custom_params)
+            client = self._get_openai_client()
+            request_params = self._build_request_params(messages, **kwargs)
             
             # 调用API
-            response = client.chat.completions.create(**request_params)
+            response = await client.chat.completions.create(**request_params)
             
             # 解析响应
             choice = response.choices[0]
@@ -278,129 +842,172 @@ class OpenAIModel(ModelBase):
                     'total_tokens': response.usage.total_tokens
                 },
                 finish_reason=choice.finish_reason,
-                metadata={'api': 'openai'}
+                metadata={'api': self.API_LABEL, **self.RESPONSE_METADATA}
             )
             
         except ImportError:
             self.log_warning("OpenAI SDK not installed, using simulation")
             return await self._simulate_response(messages)
         except Exception as e:
-            self.log_error(f"OpenAI API call failed: {e}")
+            self.log_error(f"{self.API_NAME} API call failed: {e}")
             raise
     
     async def _simulate_response(self, messages: List[Dict[str, str]]) -> ModelResponse:
         """模拟响应（当SDK不可用时）"""
         await asyncio.sleep(0.5)
         
-        response_content = f"这是来自{self.config.model_name}的模拟响应。"
+        response_content = f"这是来自{self.SIMULATION_PREFIX}{self.config.model_name}的模拟响应。"
         
         if messages:
             last_user_message = next((msg['content'] for msg in reversed(messages) if msg['role'] == 'user'), '')
             if last_user_message:
-                response_content += f"\n\n您说：{last_user_message}\n\n我的回复：这是一个模拟的响应。请安装OpenAI SDK并配置API密钥以使用真实API。"
+                response_content += f"\n\n您说：{last_user_message}\n\n我的回复：这是一个模拟的响应。{self.SIMULATION_HINT}"
         
         return ModelResponse(
             content=response_content,
             model=self.config.model_name,
-            usage={
-                'prompt_tokens': sum(len(msg['content']) for msg in messages),
-                'completion_tokens': len(response_content),
-                'total_tokens': sum(len(msg['content']) for msg in messages) + len(response_content)
-            },
+            usage=self._simulated_usage(messages, response_content),
             finish_reason="stop",
-            metadata={'api': 'openai', 'simulated': True}
+            metadata={'api': self.API_LABEL, 'simulated': True}
         )
 
 
-class AiHubMixModel(ModelBase):
-    """AiHubMix模型实现 - 使用OpenAI兼容接口"""
+class OpenAIModel(_OpenAICompatibleModel):
+    """OpenAI模型实现"""
     
-    def __init__(self, model_id: str = "aihubmix_model", config: Optional[ModelConfig] = None):
+    def __init__(self, model_id: str = "openai_model", config: Optional[ModelConfig] = None):
         if config is None:
             config = ModelConfig(
-                model_name="gpt-4o-mini",
-                api_key="",  # 需要设置AIHUBMIX_API_KEY
-                api_base="https://aihubmix.com/v1"
+                model_name="gpt-3.5-turbo",
+                api_key="",  # 需要在配置中设置
+                api_base="https://api.openai.com/v1"
             )
         super().__init__(model_id, config)
     
-    async def _call_api(self, messages: List[Dict[str, str]], **kwargs) -> ModelResponse:
-        """调用AiHubMix API"""
-        try:
-            import openai
-            
-            # 配置OpenAI客户端使用AiHubMix端点
-            client = openai.OpenAI(
-                api_key=self.config.api_key,
-                base_url=self.config.api_base
-            )
-            
-            # 准备请求参数
-            request_params = {
-                'model': self.config.model_name,
-                'messages': messages,
-                'temperature': kwargs.get('temperature', self.config.temperature),
-                'max_tokens': kwargs.get('max_tokens', self.config.max_tokens),
-                'top_p': kwargs.get('top_p', self.config.top_p),
-            }
-            
-            # AiHubMix特有参数
-            if 'web_search_options' in kwargs:
-                request_params['web_search_options'] = kwargs['web_search_options']
-            
-            # 添加自定义参数
-            request_params.update(self.config.custom_params)
+    def _build_request_params(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """准备请求参数，OpenAI额外支持惩罚参数"""
+        request_params = super()._build_request_params(messages, **kwargs)
+        request_params.setdefault('frequency_penalty', kwargs.get('frequency_penalty', self.config.frequency_penalty))
+        request_params.setdefault('presence_penalty', kwargs.get('presence_penalty', self.config.presence_penalty))
+        return request_params
+    
+    # Batch API的终止状态
+    BATCH_TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+    
+    async def submit_batch(self, items: List[Dict[str, Any]], poll_interval: float = 30.0,
+                           completion_window: str = "24h") -> Dict[str, ModelResponse]:
+        """
+        通过OpenAI Batch API离线处理一批请求
+        
+        适合分析、测试等对延迟不敏感的批量任务：请求以JSONL文件上传，服务端在completion_window内完成，
+        费用约为实时调用的一半。方法会一直轮询到批次结束，调用方应将其放在后台任务中执行。
+        
+        Args:
+            items: 请求列表，每项包含custom_id、messages，以及可选的采样参数（同generate的kwargs）
+            poll_interval: 轮询批次状态的间隔（秒）
+            completion_window: 服务端完成时限
             
-            # 调用API
-            response = client.chat.completions.create(**request_params)
+        Returns:
+            custom_id -> 模型响应；单个请求失败时对应条目不在结果中，失败详情记录在日志里
+        """
+        client = self._get_openai_client()
+        
+        lines = []
+        for item in items:
+            params = {key: value for key, value in item.items() if key not in ('custom_id', 'messages')}
+            lines.append(json.dumps({
+                'custom_id': item['custom_id'],
+                'method': 'POST',
+                'url': '/v1/chat/completions',
+                'body': self._build_request_params(item['messages'], **self._merge_call_params(params))
+            }, ensure_ascii=False))
+        
+        input_file = await client.files.create(
+            file=("batch_input.jsonl", "\n".join(lines).encode('utf-8')),
+            purpose="batch"
+        )
+        batch = await client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window=completion_window
+        )
+        self.log_info(f"Batch submitted: {batch.id}", {'requests': len(lines)})
+        
+        while batch.status not in self.BATCH_TERMINAL_STATUSES:
+            await asyncio.sleep(poll_interval)
+            batch = await client.batches.retrieve(batch.id)
+        
+        if batch.status != 'completed':
+            raise RuntimeError(f"Batch {batch.id} ended with status: {batch.status}")
+        
+        results: Dict[str, ModelResponse] = {}
+        if not batch.output_file_id:
+            return results
+        
+        output = await client.files.content(batch.output_file_id)
+        for line in output.text.splitlines():
+            if not line:
+                continue
+            record = json.loads(line)
+            response = record.get('response') or {}
+            if record.get('error') or response.get('status_code') != 200:
+                self.log_warning(f"Batch request failed: {record.get('custom_id')}", {
+                    'error': record.get('error') or response.get('body')
+                })
+                continue
             
-            # 解析响应
-            choice = response.choices[0]
-            return ModelResponse(
-                content=choice.message.content,
-                model=response.model,
+            body = response['body']
+            choice = body['choices'][0]
+            usage = body.get('usage') or {}
+            results[record['custom_id']] = ModelResponse(
+                content=choice['message']['content'],
+                model=body.get('model', self.config.model_name),
                 usage={
-                    'prompt_tokens': response.usage.prompt_tokens,
-                    'completion_tokens': response.usage.completion_tokens,
-                    'total_tokens': response.usage.total_tokens
+                    'prompt_tokens': usage.get('prompt_tokens', 0),
+                    'completion_tokens': usage.get('completion_tokens', 0),
+                    'total_tokens': usage.get('total_tokens', 0)
                 },
-                finish_reason=choice.finish_reason,
-                metadata={'api': 'aihubmix'}
+                finish_reason=choice.get('finish_reason', 'stop'),
+                metadata={'api': 'openai', 'batch_id': batch.id}
             )
-            
-        except ImportError:
-            self.log_warning("OpenAI SDK not installed, using simulation")
-            return await self._simulate_response(messages)
-        except Exception as e:
-            self.log_error(f"AiHubMix API call failed: {e}")
-            raise
-    
-    async def _simulate_response(self, messages: List[Dict[str, str]]) -> ModelResponse:
-        """模拟响应（当SDK不可用时）"""
-        await asyncio.sleep(0.5)
-        
-        response_content = f"这是来自AiHubMix {self.config.model_name}的模拟响应。"
-        
-        if messages:
-            last_user_message = next((msg['content'] for msg in reversed(messages) if msg['role'] == 'user'), '')
-            if last_user_message:
-                response_content += f"\n\n您说：{last_user_message}\n\n我的回复：这是一个模拟的响应。请安装OpenAI SDK并配置AIHUBMIX_API_KEY以使用真实的AiHubMix API。"
+            self.call_count += 1
+            self.total_tokens += usage.get('total_tokens', 0)
         
-        return ModelResponse(
-            content=response_content,
-            model=self.config.model_name,
-            usage={
-                'prompt_tokens': sum(len(msg['content']) for msg in messages),
-                'completion_tokens': len(response_content),
-                'total_tokens': sum(len(msg['content']) for msg in messages) + len(response_content)
-            },
-            finish_reason="stop",
-            metadata={'api': 'aihubmix', 'simulated': True}
-        )
+        return results
+
+
+class AiHubMixModel(_OpenAICompatibleModel):
+    """AiHubMix模型实现 - 使用OpenAI兼容接口"""
+    
+    API_LABEL = "aihubmix"
+    API_NAME = "AiHubMix"
+    SIMULATION_PREFIX = "AiHubMix "
+    SIMULATION_HINT = "请安装OpenAI SDK并配置AIHUBMIX_API_KEY以使用真实的AiHubMix API。"
+    
+    def __init__(self, model_id: str = "aihubmix_model", config: Optional[ModelConfig] = None):
+        if config is None:
+            config = ModelConfig(
+                model_name="gpt-4o-mini",
+                api_key="",  # 需要设置AIHUBMIX_API_KEY
+                api_base="https://aihubmix.com/v1"
+            )
+        super().__init__(model_id, config)
+    
+    def _build_request_params(self, messages: List[Dict[str, str]], **kwargs) -> Dict[str, Any]:
+        """准备请求参数，补充AiHubMix特有参数"""
+        request_params = super()._build_request_params(messages, **kwargs)
+        if 'web_search_options' in kwargs:
+            request_params.setdefault('web_search_options', kwargs['web_search_options'])
+        return request_params
 
 
-class ZhipuAIModel(ModelBase):
-    """智谱AI模型实现"""
+class ZhipuAIModel(_OpenAICompatibleModel):
+    """智谱AI模型实现 - 优先通过异步OpenAI兼容接口调用，未安装OpenAI SDK时使用zhipuai SDK"""
+    
+    API_LABEL = "zhipuai"
+    API_NAME = "OpenAI-compatible ZhipuAI"
+    SIMULATION_HINT = "请安装zhipuai SDK或OpenAI SDK并确保API密钥配置正确以使用真实的智谱AI API。"
+    RESPONSE_METADATA = {'sdk': 'openai_compatible'}
     
     def __init__(self, model_id: str = "zhipuai_model", config: Optional[ModelConfig] = None):
         if config is None:
@@ -412,90 +1019,28 @@ class ZhipuAIModel(ModelBase):
                 retry_times=3  # 保持3次重试
             )
         super().__init__(model_id, config)
+        # 复用的zhipuai SDK客户端，首次调用时创建
+        self._zhipu_client = None
     
     async def _call_api(self, messages: List[Dict[str, str]], **kwargs) -> ModelResponse:
         """调用智谱AI API"""
         try:
-            # 尝试使用zhipuai SDK
-            try:
-                from zhipuai import ZhipuAI
-                
-                # 创建客户端
-                client = ZhipuAI(api_key=self.config.api_key)
-                
-                # 准备请求参数
-                request_params = {
-                    'model': self.config.model_name,
-                    'messages': messages,
-                    'temperature': kwargs.get('temperature', self.config.temperature),
-                    'max_tokens': kwargs.get('max_tokens', self.config.max_tokens),
-                    'top_p': kwargs.get('top_p', self.config.top_p),
-                }
-                
-                # 添加自定义参数
-                request_params.update(self.config.custom_params)
-                
-                # 调用API（同步调用，需要在异步环境中运行）
-                import asyncio
-                loop = asyncio.get_event_loop()
-                response = await loop.run_in_executor(
-                    None, 
-                    lambda: client.chat.completions.create(**request_params)
-                )
-                
-                # 解析响应
-                choice = response.choices[0]
-                return ModelResponse(
-                    content=choice.message.content,
-                    model=response.model,
-                    usage={
-                        'prompt_tokens': response.usage.prompt_tokens,
-                        'completion_tokens': response.usage.completion_tokens,
-                        'total_tokens': response.usage.total_tokens
-                    },
-                    finish_reason=choice.finish_reason,
-                    metadata={'api': 'zhipuai', 'sdk': 'zhipuai'}
-                )
-                
-            except ImportError:
-                self.log_warning("ZhipuAI SDK not installed, trying OpenAI-compatible API")
-                # 使用OpenAI兼容的方式调用
+            if openai is not None or ZhipuAI is None:
+                # 智谱AI提供OpenAI兼容端点，异步客户端直接await，不占用线程池；
+                # 两个SDK都未安装时由兼容接口退化为模拟响应
                 return await self._call_openai_compatible_api(messages, **kwargs)
-                
-        except Exception as e:
-            self.log_error(f"ZhipuAI API call failed: {e}")
-            # 如果真实API调用失败，返回模拟响应作为降级
-            return await self._simulate_response(messages)
-    
-    async def _call_openai_compatible_api(self, messages: List[Dict[str, str]], **kwargs) -> ModelResponse:
-        """使用OpenAI兼容接口调用智谱AI API"""
-        try:
-            import openai
-            import asyncio
-            
-            # 配置OpenAI客户端使用智谱AI端点
-            client = openai.OpenAI(
-                api_key=self.config.api_key,
-                base_url=self.config.api_base,
-                timeout=self.config.timeout
-            )
             
-            # 准备请求参数
-            request_params = {
-                'model': self.config.model_name,
-                'messages': messages,
-                'temperature': kwargs.get('temperature', self.config.temperature),
-                'max_tokens': kwargs.get('max_tokens', self.config.max_tokens),
-                'top_p': kwargs.get('top_p', self.config.top_p),
-            }
+            # zhipuai SDK只提供同步客户端，在线程池中执行
+            # 复用客户端，保持底层连接池
+            if self._zhipu_client is None:
+                self._zhipu_client = ZhipuAI(api_key=self.config.api_key)
+            client = self._zhipu_client
+            request_params = self._build_request_params(messages, **kwargs)
             
-            # 添加自定义参数
-            request_params.update(self.config.custom_params)
-            
-            # 在线程池中执行同步调用
-            loop = asyncio.get_event_loop()
+            # 调用API（同步调用，需要在异步环境中运行）
+            loop = asyncio.get_running_loop()
             response = await loop.run_in_executor(
-                None,
+                None, 
                 lambda: client.chat.completions.create(**request_params)
             )
             
@@ -510,38 +1055,13 @@ class ZhipuAIModel(ModelBase):
                     'total_tokens': response.usage.total_tokens
                 },
                 finish_reason=choice.finish_reason,
-                metadata={'api': 'zhipuai', 'sdk': 'openai_compatible'}
+                metadata={'api': 'zhipuai', 'sdk': 'zhipuai'}
             )
-            
-        except ImportError:
-            self.log_warning("OpenAI SDK not installed, using simulation")
-            return await self._simulate_response(messages)
+                
         except Exception as e:
-            self.log_error(f"OpenAI-compatible ZhipuAI API call failed: {e}")
-            raise
-    
-    async def _simulate_response(self, messages: List[Dict[str, str]]) -> ModelResponse:
-        """模拟响应（当SDK不可用或API调用失败时）"""
-        await asyncio.sleep(0.5)
-        
-        response_content = f"这是来自{self.config.model_name}的模拟响应。"
-        
-        if messages:
-            last_user_message = next((msg['content'] for msg in reversed(messages) if msg['role'] == 'user'), '')
-            if last_user_message:
-                response_content += f"\n\n您说：{last_user_message}\n\n我的回复：这是一个模拟的响应。请安装zhipuai SDK或OpenAI SDK并确保API密钥配置正确以使用真实的智谱AI API。"
-        
-        return ModelResponse(
-            content=response_content,
-            model=self.config.model_name,
-            usage={
-                'prompt_tokens': sum(len(msg['content']) for msg in messages),
-                'completion_tokens': len(response_content),
-                'total_tokens': sum(len(msg['content']) for msg in messages) + len(response_content)
-            },
-            finish_reason="stop",
-            metadata={'api': 'zhipuai', 'simulated': True}
-        )
+            self.log_error(f"ZhipuAI API call failed: {e}")
+            # 如果真实API调用失败，返回模拟响应作为降级
+            return await self._simulate_response(messages)
 
 
 class ModelFactory:
@@ -554,6 +1074,11 @@ class ModelFactory:
         'zhipuai': ZhipuAIModel,  # 兼容性别名
     }
     
+    # 别名映射 - 统一使用zhipu作为标准标识符，模型ID也据此生成
+    _type_aliases = {
+        'zhipuai': 'zhipu',  # zhipuai是zhipu的别名
+    }
+    
     @classmethod
     def create_model(cls, model_type: str, config: ModelConfig) -> ModelBase:
         """
@@ -569,21 +1094,18 @@ class ModelFactory:
         # 标准化模型类型名称
         normalized_type = cls._normalize_model_type(model_type)
         
-        if normalized_type not in cls._model_classes:
+        model_class = cls._model_classes.get(normalized_type)
+        if model_class is None:
             available_types = list(cls._model_classes.keys())
             raise ValueError(f"Unknown model type: {model_type}. Available types: {available_types}")
         
-        model_class = cls._model_classes[normalized_type]
         return model_class(f"{normalized_type}_model", config)
     
     @classmethod
     def _normalize_model_type(cls, model_type: str) -> str:
         """标准化模型类型名称"""
-        # 处理别名映射 - 统一使用zhipu作为标准标识符
-        aliases = {
-            'zhipuai': 'zhipu',  # zhipuai是zhipu的别名
-        }
-        return aliases.get(model_type.lower(), model_type.lower())
+        model_type = model_type.lower()
+        return cls._type_aliases.get(model_type, model_type)
     
     @classmethod
     def register_model_class(cls, model_type: str, model_class: type):
@@ -4,15 +4,76 @@ Prompt - 提示词管理模块
 """
 
 import json
-from typing import Dict, List, Any, Optional
+import re
+import sys
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Dict, List, Any, Optional, Tuple, Union, Iterator
 from dataclasses import dataclass, field
 from string import Template
 
 from ..FlowTools.base_component import BaseComponent
 from ..ContextEngineer.context_manager import StructuredContext
+from .Models import _DATACLASS_SLOTS
 
+# 可选的Jinja2模板引擎，只有metadata中指定backend为'jinja'的模板才会用到
+try:
+    import jinja2
+except ImportError:
+    jinja2 = None
 
-@dataclass
+# 模板中的$variable格式变量
+_TEMPLATE_VAR_RE = re.compile(r'\$(\w+)')
+
+# 进程内共享的Jinja2环境，首次编译jinja模板时创建
+_jinja_environment = None
+
+
+def _get_jinja_environment():
+    """获取共享的Jinja2环境（提示词是纯文本，不做HTML转义）"""
+    global _jinja_environment
+    if jinja2 is None:
+        raise ImportError("jinja2 not installed, required by templates with backend 'jinja'")
+    if _jinja_environment is None:
+        _jinja_environment = jinja2.Environment(autoescape=False)
+    return _jinja_environment
+
+
+def _compile_template(template: str) -> Tuple[Union[str, Tuple[str, str]], ...]:
+    """
+    预解析模板文本
+    
+    按string.Template的语法把模板切分为片段：字符串是字面文本（$$已还原为$），
+    (变量名, 原文)元组是待替换的变量，原文用于变量缺失时原样保留（与safe_substitute一致）。
+    片段都经过驻留：各模板中相同的字面文本共享同一个字符串，变量名与关键字参数名是同一对象，
+    格式化时的字典查找按对象标识即可命中。
+    """
+    segments: List[Union[str, Tuple[str, str]]] = []
+    literal = ""
+    last_end = 0
+    for match in Template.pattern.finditer(template):
+        literal += template[last_end:match.start()]
+        last_end = match.end()
+        
+        name = match.group('named') or match.group('braced')
+        if name is not None:
+            if literal:
+                segments.append(sys.intern(literal))
+                literal = ""
+            segments.append((sys.intern(name), sys.intern(match.group())))
+        elif match.group('escaped') is not None:
+            literal += Template.delimiter
+        else:
+            # 不合法的占位符原样保留
+            literal += match.group()
+    
+    literal += template[last_end:]
+    if literal:
+        segments.append(sys.intern(literal))
+    return tuple(segments)
+
+
+@dataclass(**_DATACLASS_SLOTS)
 class PromptTemplate:
     """提示词模板"""
     name: str
@@ -20,25 +81,127 @@ class PromptTemplate:
     description: str = ""
     variables: List[str] = field(default_factory=list)
     metadata: Dict[str, Any] = field(default_factory=dict)
+    # 预解析的模板片段及其对应的模板文本，模板文本被替换后重新解析
+    _segments: Tuple[Union[str, Tuple[str, str]], ...] = field(default=(), init=False, repr=False, compare=False)
+    _segments_source: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    # jinja后端编译好的模板及其对应的模板文本
+    _compiled: Any = field(default=None, init=False, repr=False, compare=False)
+    _compiled_source: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    
+    @property
+    def backend(self) -> str:
+        """模板后端：默认'template'（$variable语法），metadata中可指定'jinja'以支持条件和循环"""
+        return self.metadata.get('backend', 'template')
+    
+    def _ensure_segments(self) -> Tuple[Union[str, Tuple[str, str]], ...]:
+        """获取预解析的模板片段，模板文本变化后重新解析"""
+        if self._segments_source is not self.template:
+            self._segments = _compile_template(self.template)
+            self._segments_source = self.template
+        return self._segments
+    
+    def _ensure_compiled(self) -> Any:
+        """获取编译好的Jinja2模板，模板文本变化后重新编译"""
+        if self._compiled_source is not self.template:
+            self._compiled = _get_jinja_environment().from_string(self.template)
+            self._compiled_source = self.template
+        return self._compiled
     
     def format(self, **kwargs) -> str:
-        """格式化模板"""
-        # 使用Template进行安全的字符串替换
-        template_obj = Template(self.template)
-        return template_obj.safe_substitute(**kwargs)
+        """
+        格式化模板
+        
+        默认后端与string.Template.safe_substitute语义一致，缺失的变量原样保留；
+        jinja后端按Jinja2语法渲染，缺失的变量渲染为空。
+        """
+        if self.backend == 'jinja':
+            return self._ensure_compiled().render(**kwargs)
+        
+        parts = []
+        for segment in self._ensure_segments():
+            if segment.__class__ is str:
+                parts.append(segment)
+            else:
+                name, placeholder = segment
+                parts.append(str(kwargs[name]) if name in kwargs else placeholder)
+        return "".join(parts)
+
+
+class _LazyTemplateView(Mapping):
+    """
+    模板列表的只读视图
+    
+    直接基于管理器的模板表，条目在被访问时才生成并按模板对象缓存，
+    只预览少数模板时不必构建全部条目；需要普通字典时用dict(view)转换。
+    """
+    
+    def __init__(self, templates: Dict[str, PromptTemplate]):
+        self._templates = templates
+        # 模板类型 -> (模板对象, 条目)
+        self._entries: Dict[str, Tuple[PromptTemplate, Dict[str, Any]]] = {}
+    
+    def __getitem__(self, template_type: str) -> Dict[str, Any]:
+        template = self._templates[template_type]
+        cached = self._entries.get(template_type)
+        if cached is not None and cached[0] is template:
+            return cached[1]
+        
+        entry = {
+            'name': template.name,
+            'description': template.description,
+            'variables': template.variables,
+            'preview': template.template[:200] + '...' if len(template.template) > 200 else template.template
+        }
+        self._entries[template_type] = (template, entry)
+        return entry
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._templates)
+    
+    def __len__(self) -> int:
+        return len(self._templates)
 
 
 class PromptManager(BaseComponent):
     """提示词管理器"""
     
+    # 各管理器类的默认模板，进程内只构建一次，所有实例共享同一批只读模板对象
+    _default_templates_by_class: Dict[type, Dict[str, PromptTemplate]] = {}
+    
+    # 生成结果缓存容量
+    PROMPT_CACHE_SIZE = 256
+    
+    # Agent元数据变量缓存容量
+    AGENT_VARS_CACHE_SIZE = 64
+    
     def __init__(self, manager_id: str = "prompt_manager"):
         super().__init__(manager_id, "prompt_manager")
         
         # 存储提示词模板
         self.templates: Dict[str, PromptTemplate] = {}
         
-        # 初始化默认模板
-        self._init_default_templates()
+        # 生成结果缓存（LRU）：模板、上下文、Agent元数据和额外变量都相同时直接复用上次的提示词
+        self._prompt_cache: "OrderedDict[Tuple, str]" = OrderedDict()
+        
+        # Agent元数据 -> 模板变量（LRU）：元数据内容不变时复用，不再重复拼接能力列表
+        self._agent_vars_cache: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        
+        # 最近一次的对话历史片段：(历史列表, 长度, 最后一轮, 格式化历史, 历史摘要)
+        self._history_fragments_memo: Optional[Tuple[List[Dict[str, Any]], int, Any, str, str]] = None
+        
+        # 初始化默认模板：首个实例构建并登记，之后的实例直接复制模板表
+        default_templates = PromptManager._default_templates_by_class.get(type(self))
+        if default_templates is None:
+            self._init_default_templates()
+            # 共享的默认模板在登记时就完成预解析，之后各实例只读使用
+            for template in self.templates.values():
+                template._ensure_segments()
+            PromptManager._default_templates_by_class[type(self)] = dict(self.templates)
+        else:
+            self.templates.update(default_templates)
+        
+        # 系统提示词模板的直接引用，经set_system_prompt/add_template/import_templates更新
+        self._system_template: Optional[PromptTemplate] = self.templates.get("system")
         
         self.log_debug("PromptManager initialized", {
             'template_count': len(self.templates)
@@ -171,7 +334,13 @@ b. $requirement_2
     
     def add_template(self, template_type: str, template: PromptTemplate) -> None:
         """添加提示词模板"""
+        # jinja模板在添加时编译一次，语法错误尽早暴露
+        if template.backend == 'jinja':
+            template._ensure_compiled()
+        
         self.templates[template_type] = template
+        if template_type == "system":
+            self._system_template = template
         
         self.log_debug(f"Added template: {template_type}", {
             'template_name': template.name,
@@ -185,16 +354,17 @@ b. $requirement_2
         Args:
             prompt: 系统提示词内容
         """
-        # 创建自定义系统提示词模板
+        # 创建自定义系统提示词模板（驻留提示词文本，同一提示词的多个Agent共享一份字符串）
         system_template = PromptTemplate(
             name="custom_system_prompt",
-            template=prompt,
+            template=sys.intern(prompt),
             description="Custom system prompt set by user",
             variables=[]
         )
         
         # 存储为系统模板
         self.templates["system"] = system_template
+        self._system_template = system_template
         
         self.log_debug("System prompt set", {
             'prompt_length': len(prompt)
@@ -202,7 +372,7 @@ b. $requirement_2
     
     def get_system_prompt(self) -> Optional[str]:
         """获取系统提示词"""
-        system_template = self.templates.get("system")
+        system_template = self._system_template
         if system_template:
             return system_template.template
         return None
@@ -233,6 +403,14 @@ b. $requirement_2
             self.log_warning(f"Template not found: {template_type}")
             return f"[未找到模板: {template_type}]"
         
+        agent_key = self._agent_metadata_key(agent_metadata) if agent_metadata else None
+        cache_key = self._prompt_cache_key(template_type, template, context, agent_key, kwargs)
+        if cache_key is not None:
+            cached_prompt = self._prompt_cache.get(cache_key)
+            if cached_prompt is not None:
+                self._prompt_cache.move_to_end(cache_key)
+                return cached_prompt
+        
         # 准备模板变量
         template_vars = kwargs.copy()
         
@@ -244,22 +422,13 @@ b. $requirement_2
             
             # 对话历史
             if context.conversation_history:
-                template_vars['conversation_history'] = self._format_conversation_history(context.conversation_history)
-                template_vars['conversation_summary'] = self._summarize_conversation(context.conversation_history)
+                history_text, history_summary = self._get_history_fragments(context.conversation_history)
+                template_vars['conversation_history'] = history_text
+                template_vars['conversation_summary'] = history_summary
         
         # 从Agent元数据提取信息
         if agent_metadata:
-            template_vars['agent_name'] = getattr(agent_metadata, 'name', 'Agent')
-            template_vars['role_description'] = getattr(agent_metadata, 'description', '')
-            
-            # 能力列表
-            capabilities = getattr(agent_metadata, 'capabilities', [])
-            if capabilities:
-                template_vars['available_tools'] = '\n'.join(f"- {cap}" for cap in capabilities)
-            
-            # 自定义属性
-            custom_attrs = getattr(agent_metadata, 'custom_attributes', {})
-            template_vars.update(custom_attrs)
+            template_vars.update(self._get_agent_vars(agent_metadata, agent_key))
         
         # 格式化模板
         try:
@@ -270,12 +439,104 @@ b. $requirement_2
                 'variables_used': list(template_vars.keys())
             })
             
+            if cache_key is not None:
+                self._prompt_cache[cache_key] = prompt
+                if len(self._prompt_cache) > self.PROMPT_CACHE_SIZE:
+                    self._prompt_cache.popitem(last=False)
+            
             return prompt
             
         except Exception as e:
             self.log_error(f"Error formatting template: {template_type}", e)
             return f"[模板格式化错误: {str(e)}]"
     
+    def _agent_metadata_key(self, agent_metadata: Any) -> Tuple:
+        """提取get_prompt用到的Agent元数据内容，同时用作提示词缓存键和元数据变量缓存键"""
+        return (
+            getattr(agent_metadata, 'name', 'Agent'),
+            getattr(agent_metadata, 'description', ''),
+            tuple(getattr(agent_metadata, 'capabilities', None) or ()),
+            tuple(sorted(getattr(agent_metadata, 'custom_attributes', {}).items()))
+        )
+    
+    def _get_agent_vars(self, agent_metadata: Any, agent_key: Tuple) -> Dict[str, Any]:
+        """
+        获取Agent元数据对应的模板变量
+        
+        按元数据内容缓存，协调者反复调用元数据不变的Agent时直接复用；
+        自定义属性中有不可哈希的值时不缓存。返回的字典由缓存持有，调用方只读使用。
+        """
+        try:
+            agent_vars = self._agent_vars_cache.get(agent_key)
+        except TypeError:
+            agent_key = None
+            agent_vars = None
+        if agent_vars is not None:
+            self._agent_vars_cache.move_to_end(agent_key)
+            return agent_vars
+        
+        agent_vars = {
+            'agent_name': getattr(agent_metadata, 'name', 'Agent'),
+            'role_description': getattr(agent_metadata, 'description', '')
+        }
+        
+        # 能力列表
+        capabilities = getattr(agent_metadata, 'capabilities', [])
+        if capabilities:
+            agent_vars['available_tools'] = '\n'.join(f"- {cap}" for cap in capabilities)
+        
+        # 自定义属性
+        custom_attrs = getattr(agent_metadata, 'custom_attributes', {})
+        agent_vars.update(custom_attrs)
+        
+        if agent_key is not None:
+            self._agent_vars_cache[agent_key] = agent_vars
+            if len(self._agent_vars_cache) > self.AGENT_VARS_CACHE_SIZE:
+                self._agent_vars_cache.popitem(last=False)
+        return agent_vars
+    
+    def _prompt_cache_key(self, template_type: str, template: PromptTemplate,
+                          context: Optional[StructuredContext], agent_key: Optional[Tuple],
+                          kwargs: Dict[str, Any]) -> Optional[Tuple]:
+        """
+        生成提示词缓存键，只包含get_prompt实际用到的内容
+        
+        模板以对象标识和模板文本参与，模板被替换或修改后自然失效；
+        对话历史以渲染用到的片段（最近几轮的格式化文本和摘要，由_get_history_fragments记住）和轮数参与，
+        工具结果以个数和最后一条的截断内容参与，键的大小和计算开销都不随对话变长而增长；
+        变量中有不可哈希的值时返回None，本次不使用缓存。
+        """
+        context_key = None
+        if context:
+            history = context.conversation_history
+            history_key = (len(history),) + self._get_history_fragments(history) if history else None
+            
+            tool_results = context.tool_results
+            tool_results_key = None
+            if tool_results:
+                last_result = tool_results[-1]
+                tool_results_key = (
+                    len(tool_results),
+                    last_result.get('metadata', {}).get('tool_name', 'unknown'),
+                    last_result['content'][:100]
+                )
+            
+            context_key = (
+                context.user_input,
+                tuple(context.developer_instructions or ()),
+                tool_results_key,
+                len(context.external_data or ()),
+                tuple(data['content'][:100] for data in (context.external_data or ())[:3]),
+                history_key
+            )
+        
+        cache_key = (template_type, id(template), template.template, context_key, agent_key, tuple(sorted(kwargs.items())))
+        try:
+            hash(cache_key)
+        except TypeError:
+            return None
+        return cache_key
+    
     def _generate_context_summary(self, context: StructuredContext) -> str:
         """生成上下文摘要"""
         summary_parts = []
@@ -292,34 +553,55 @@ b. $requirement_2
         return "；".join(summary_parts) if summary_parts else "无历史上下文"
     
     def _format_context_info(self, context: StructuredContext) -> str:
-        """格式化上下文信息"""
-        info_parts = []
+        """格式化上下文信息（所有行收集到同一个列表，最后只拼接一次）"""
+        parts = []
+        append = parts.append
         
         # 开发者指令
         if context.developer_instructions:
-            info_parts.append("开发者指令：")
-            info_parts.extend(f"  - {instruction}" for instruction in context.developer_instructions)
+            append("开发者指令：")
+            for instruction in context.developer_instructions:
+                append(f"  - {instruction}")
         
         # 工具结果
         if context.tool_results:
-            info_parts.append("\n工具调用结果：")
+            append("\n工具调用结果：")
             for result in context.tool_results:
                 tool_name = result.get('metadata', {}).get('tool_name', 'unknown')
-                info_parts.append(f"  - {tool_name}: {result['content'][:100]}...")
+                append(f"  - {tool_name}: {result['content'][:100]}...")
         
         # 外部数据
         if context.external_data:
-            info_parts.append("\n相关信息：")
+            append("\n相关信息：")
             for data in context.external_data[:3]:  # 只显示前3条
-                info_parts.append(f"  - {data['content'][:100]}...")
+                append(f"  - {data['content'][:100]}...")
         
-        return "\n".join(info_parts) if info_parts else "无额外上下文信息"
+        return "\n".join(parts) if parts else "无额外上下文信息"
+    
+    def _get_history_fragments(self, history: List[Dict[str, Any]]) -> Tuple[str, str]:
+        """
+        获取对话历史的格式化文本和摘要
+        
+        上下文管理器在多次调用间复用同一个历史列表，按（列表对象, 长度, 最后一轮）记住上次的结果，
+        历史未变化时直接复用，避免每次都重新扫描整个历史。
+        """
+        memo = self._history_fragments_memo
+        if (memo is not None and memo[0] is history
+                and memo[1] == len(history) and history[-1] is memo[2]):
+            return memo[3], memo[4]
+        
+        history_text = self._format_conversation_history(history)
+        history_summary = self._summarize_conversation(history)
+        self._history_fragments_memo = (history, len(history), history[-1], history_text, history_summary)
+        return history_text, history_summary
     
     def _format_conversation_history(self, history: List[Dict[str, Any]]) -> str:
         """格式化对话历史"""
         formatted_turns = []
         
-        for turn in history[-5:]:  # 只显示最近5轮
+        # 只显示最近5轮，按下标直接遍历，不复制历史切片
+        for index in range(max(0, len(history) - 5), len(history)):
+            turn = history[index]
             if 'user' in turn:
                 formatted_turns.append(f"用户：{turn['user']}")
             if 'assistant' in turn:
@@ -332,16 +614,22 @@ b. $requirement_2
         if not history:
             return "无对话历史"
         
-        # 简单的总结逻辑
-        topics = []
+        # 简单的总结逻辑：按出现顺序收集去重的主题词，凑满5个即停止扫描
+        topics: Dict[str, None] = {}
         for turn in history:
             if 'user' in turn:
-                # 提取可能的主题词（简化实现）
-                words = turn['user'].split()
-                important_words = [w for w in words if len(w) > 4][:3]
-                topics.extend(important_words)
-        
-        unique_topics = list(set(topics))[:5]
+                # 提取可能的主题词（简化实现）：每轮最多取前3个长词
+                taken = 0
+                for word in turn['user'].split():
+                    if len(word) > 4:
+                        topics[word] = None
+                        taken += 1
+                        if taken >= 3 or len(topics) >= 5:
+                            break
+                if len(topics) >= 5:
+                    break
+        
+        unique_topics = list(topics)
         
         if unique_topics:
             return f"讨论了关于{', '.join(unique_topics)}等话题"
@@ -356,10 +644,8 @@ b. $requirement_2
         """创建自定义模板"""
         # 自动检测模板中的变量
         if variables is None:
-            import re
-            # 查找所有$variable格式的变量
-            variables = re.findall(r'\$(\w+)', template_str)
-            variables = list(set(variables))  # 去重
+            # 查找所有$variable格式的变量，按首次出现的顺序去重
+            variables = list(dict.fromkeys(_TEMPLATE_VAR_RE.findall(template_str)))
         
         template = PromptTemplate(
             name=name,
@@ -374,17 +660,9 @@ b. $requirement_2
         
         return template
     
-    def list_templates(self) -> Dict[str, Dict[str, Any]]:
-        """列出所有模板"""
-        return {
-            template_type: {
-                'name': template.name,
-                'description': template.description,
-                'variables': template.variables,
-                'preview': template.template[:200] + '...' if len(template.template) > 200 else template.template
-            }
-            for template_type, template in self.templates.items()
-        }
+    def list_templates(self) -> Mapping:
+        """列出所有模板（惰性只读视图，条目在访问时生成）"""
+        return _LazyTemplateView(self.templates)
     
     def export_templates(self) -> Dict[str, Any]:
         """导出所有模板"""
@@ -427,7 +705,7 @@ b. $requirement_2
                 )
             
             elif action == 'list_templates':
-                return self.list_templates()
+                return dict(self.list_templates())
             
             elif action == 'create_custom':
                 template = self.create_custom_template(
@@ -8,6 +8,7 @@ from .calculator import CalculatorTool
 from .file_tool import FileTool
 from .web_search import WebSearchTool
 from .code_executor import CodeExecutorTool
+from .batching import batchable, BatchedToolDispatcher
 
 __all__ = [
     'BaseTool',
@@ -15,5 +16,7 @@ __all__ = [
     'CalculatorTool',
     'FileTool',
     'WebSearchTool',
-    'CodeExecutorTool'
+    'CodeExecutorTool',
+    'batchable',
+    'BatchedToolDispatcher'
 ]
@@ -6,12 +6,24 @@ BaseTool - 工具基类
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional, List, Tuple
 from dataclasses import dataclass, field
+import logging
 import time
 
 from ...FlowTools.base_component import BaseComponent
+from ..Models import _LogLevelMixin, _DATACLASS_SLOTS
 
+# 参数类型名 -> Python类型
+_TYPE_MAP = {
+    'string': str,
+    'number': (int, float),
+    'boolean': bool,
+    'object': dict,
+    'array': list,
+    'any': object
+}
 
-@dataclass
+
+@dataclass(**_DATACLASS_SLOTS)
 class ToolResult:
     """工具执行结果"""
     success: bool
@@ -21,7 +33,7 @@ class ToolResult:
     metadata: Dict[str, Any] = field(default_factory=dict)
 
 
-class BaseTool(BaseComponent, ABC):
+class BaseTool(_LogLevelMixin, BaseComponent, ABC):
     """工具基类"""
     
     def __init__(self, tool_id: str, tool_name: str, description: str = ""):
@@ -33,8 +45,10 @@ class BaseTool(BaseComponent, ABC):
         
         # 工具参数定义
         self.parameters = self._define_parameters()
+        self._compile_parameters()
         
-        self.log_debug(f"Tool {tool_name} initialized")
+        if self._is_log_enabled(logging.DEBUG):
+            self.log_debug(f"Tool {tool_name} initialized")
     
     @abstractmethod
     def _define_parameters(self) -> Dict[str, Dict[str, Any]]:
@@ -67,6 +81,29 @@ class BaseTool(BaseComponent, ABC):
         """
         pass
     
+    def _compile_parameters(self) -> None:
+        """
+        预处理参数定义，供每次调用时的校验直接使用
+        
+        子类在初始化之后替换self.parameters时需要重新调用。
+        """
+        # 必需参数名（按定义顺序，缺失时报告第一个）
+        self._required_params: Tuple[str, ...] = tuple(
+            param_name for param_name, param_def in self.parameters.items()
+            if param_def.get('required', False)
+        )
+        # 参数名 -> (类型名, Python类型)
+        self._param_types: Dict[str, Tuple[str, Any]] = {}
+        for param_name, param_def in self.parameters.items():
+            expected_type = param_def.get('type', 'any')
+            self._param_types[param_name] = (expected_type, _TYPE_MAP.get(expected_type, object))
+        # 有默认值的参数
+        self._param_defaults: Dict[str, Any] = {
+            param_name: param_def['default']
+            for param_name, param_def in self.parameters.items()
+            if 'default' in param_def
+        }
+    
     def validate_parameters(self, params: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
         """
         验证参数
@@ -78,34 +115,26 @@ class BaseTool(BaseComponent, ABC):
             (是否有效, 错误信息)
         """
         # 检查必需参数
-        for param_name, param_def in self.parameters.items():
-            if param_def.get('required', False) and param_name not in params:
+        for param_name in self._required_params:
+            if param_name not in params:
                 return False, f"Missing required parameter: {param_name}"
         
         # 检查参数类型
+        param_types = self._param_types
         for param_name, param_value in params.items():
-            if param_name not in self.parameters:
+            type_info = param_types.get(param_name)
+            if type_info is None:
                 continue  # 忽略未定义的参数
             
-            expected_type = self.parameters[param_name].get('type', 'any')
-            if not self._check_type(param_value, expected_type):
+            expected_type, expected_python_type = type_info
+            if not isinstance(param_value, expected_python_type):
                 return False, f"Invalid type for parameter {param_name}: expected {expected_type}"
         
         return True, None
     
     def _check_type(self, value: Any, expected_type: str) -> bool:
         """检查值的类型"""
-        type_map = {
-            'string': str,
-            'number': (int, float),
-            'boolean': bool,
-            'object': dict,
-            'array': list,
-            'any': object
-        }
-        
-        expected_python_type = type_map.get(expected_type, object)
-        return isinstance(value, expected_python_type)
+        return isinstance(value, _TYPE_MAP.get(expected_type, object))
     
     async def execute(self, **kwargs) -> ToolResult:
         """
@@ -117,7 +146,7 @@ class BaseTool(BaseComponent, ABC):
         Returns:
             工具执行结果
         """
-        start_time = time.time()
+        start_time = time.perf_counter()
         
         try:
             # 验证参数
@@ -133,23 +162,25 @@ class BaseTool(BaseComponent, ABC):
                     error=error_msg
                 )
             
-            # 填充默认值
-            final_params = {}
-            for param_name, param_def in self.parameters.items():
-                if param_name in kwargs:
-                    final_params[param_name] = kwargs[param_name]
-                elif 'default' in param_def:
-                    final_params[param_name] = param_def['default']
+            # 填充默认值（未定义的参数不传给工具）
+            if kwargs.keys() <= self._param_types.keys():
+                final_params = {**self._param_defaults, **kwargs}
+            else:
+                final_params = {**self._param_defaults}
+                for param_name, param_value in kwargs.items():
+                    if param_name in self._param_types:
+                        final_params[param_name] = param_value
             
-            self.log_debug(f"Executing tool {self.tool_name}", {
-                'params': final_params
-            })
+            if self._is_log_enabled(logging.DEBUG):
+                self.log_debug(f"Executing tool {self.tool_name}", {
+                    'params': final_params
+                })
             
             # 执行工具
             result = await self._execute_tool(**final_params)
             
             # 更新统计
-            execution_time = time.time() - start_time
+            execution_time = time.perf_counter() - start_time
             self.execution_count += 1
             self.total_execution_time += execution_time
             
@@ -157,9 +188,10 @@ class BaseTool(BaseComponent, ABC):
             result.execution_time = execution_time
             
             if result.success:
-                self.log_info(f"Tool {self.tool_name} executed successfully", {
-                    'execution_time': f"{execution_time:.3f}s"
-                })
+                if self._is_log_enabled(logging.INFO):
+                    self.log_info(f"Tool {self.tool_name} executed successfully", {
+                        'execution_time': f"{execution_time:.3f}s"
+                    })
             else:
                 self.log_warning(f"Tool {self.tool_name} execution failed", {
                     'error': result.error,
@@ -169,7 +201,7 @@ class BaseTool(BaseComponent, ABC):
             return result
             
         except Exception as e:
-            execution_time = time.time() - start_time
+            execution_time = time.perf_counter() - start_time
             self.log_error(f"Tool {self.tool_name} execution error", e)
             
             return ToolResult(
@@ -0,0 +1,90 @@
+"""
+Batching - 工具调用批处理
+将短时间内对同一工具的多次调用合并为一次批量调用
+"""
+
+import asyncio
+from typing import Dict, Any, List, Callable, Awaitable, Tuple
+
+
+def batchable(batch_func: Callable[[List[Dict[str, Any]]], Awaitable[List[Any]]],
+              batch_size: int = 32,
+              max_wait: float = 0.008) -> Callable:
+    """
+    将工具函数标记为可批处理
+
+    Args:
+        batch_func: 批量实现，接收参数字典列表，按相同顺序返回结果列表
+        batch_size: 单批最多合并的调用数
+        max_wait: 凑批的最长等待时间（秒）
+
+    Returns:
+        装饰器，被装饰的工具仍可单独调用
+    """
+    def decorator(tool_func: Callable) -> Callable:
+        tool_func.batch = batch_func
+        tool_func.batch_size = batch_size
+        tool_func.batch_max_wait = max_wait
+        return tool_func
+    return decorator
+
+
+class BatchedToolDispatcher:
+    """批量工具调度器 - 凑满batch_size或等待max_wait后统一调用工具的批量实现"""
+
+    def __init__(self):
+        # (事件循环, 批量实现) -> (待处理调用列表, 定时刷新句柄)
+        self._pending: Dict[Tuple[asyncio.AbstractEventLoop, Callable], Tuple[List[Tuple[Dict[str, Any], asyncio.Future]], asyncio.TimerHandle]] = {}
+
+    async def submit(self, tool_func: Callable, tool_args: Dict[str, Any]) -> Any:
+        """
+        提交一次工具调用，等待所在批次执行完成后返回本次调用的结果
+
+        Args:
+            tool_func: 经batchable标记的工具函数
+            tool_args: 本次调用的参数
+
+        Returns:
+            本次调用对应的结果
+        """
+        loop = asyncio.get_running_loop()
+        key = (loop, tool_func.batch)
+        future = loop.create_future()
+
+        if key not in self._pending:
+            timer = loop.call_later(tool_func.batch_max_wait, self._flush, key)
+            self._pending[key] = ([], timer)
+
+        calls, _ = self._pending[key]
+        calls.append((tool_args, future))
+        if len(calls) >= tool_func.batch_size:
+            self._flush(key)
+
+        return await future
+
+    def _flush(self, key: Tuple[asyncio.AbstractEventLoop, Callable]) -> None:
+        """取出当前批次并调度执行"""
+        entry = self._pending.pop(key, None)
+        if entry is None:
+            return
+
+        calls, timer = entry
+        timer.cancel()
+        loop, batch_func = key
+        loop.create_task(self._run_batch(batch_func, calls))
+
+    async def _run_batch(self, batch_func: Callable, calls: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        """执行一个批次，并把结果按顺序分发给各个调用方"""
+        try:
+            results = await batch_func([tool_args for tool_args, _ in calls])
+            if len(results) != len(calls):
+                raise ValueError(f"Batch returned {len(results)} results for {len(calls)} calls")
+        except Exception as e:
+            for _, future in calls:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(calls, results):
+            if not future.done():
+                future.set_result(result)
@@ -4,47 +4,68 @@ CalculatorTool - 计算器工具
 """
 
 import ast
+import functools
 import operator
 import math
-from typing import Dict, Any
+import sys
+from collections import OrderedDict
+from types import CodeType, MappingProxyType
+from typing import Dict, Any, Optional
 
 from .base_tool import BaseTool, ToolResult
 
 
+@functools.lru_cache(maxsize=1024)
+def _parse_expression(expression: str) -> ast.AST:
+    """解析表达式为AST（按表达式字符串缓存，重试或模板化的重复表达式无需再次解析）"""
+    try:
+        return ast.parse(expression, mode='eval').body
+    except SyntaxError:
+        raise ValueError(f"无效的表达式语法: {expression}")
+
+
+# 允许的操作符
+_ALLOWED_OPERATORS = MappingProxyType({
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: operator.pow,
+    ast.Mod: operator.mod,
+    ast.FloorDiv: operator.floordiv,
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+})
+
+# 允许的函数
+_ALLOWED_FUNCTIONS = MappingProxyType({
+    'abs': abs,
+    'round': round,
+    'min': min,
+    'max': max,
+    'sum': sum,
+    'sqrt': math.sqrt,
+    'sin': math.sin,
+    'cos': math.cos,
+    'tan': math.tan,
+    'log': math.log,
+    'log10': math.log10,
+    'exp': math.exp,
+    'pow': pow,
+    'pi': math.pi,
+    'e': math.e,
+})
+
+
 class CalculatorTool(BaseTool):
     """计算器工具 - 执行数学计算"""
     
-    # 允许的操作符
-    ALLOWED_OPERATORS = {
-        ast.Add: operator.add,
-        ast.Sub: operator.sub,
-        ast.Mult: operator.mul,
-        ast.Div: operator.truediv,
-        ast.Pow: operator.pow,
-        ast.Mod: operator.mod,
-        ast.FloorDiv: operator.floordiv,
-        ast.USub: operator.neg,
-        ast.UAdd: operator.pos,
-    }
+    # 允许的操作符和函数（模块级只读表，子类可覆盖为自己的映射）
+    ALLOWED_OPERATORS = _ALLOWED_OPERATORS
+    ALLOWED_FUNCTIONS = _ALLOWED_FUNCTIONS
     
-    # 允许的函数
-    ALLOWED_FUNCTIONS = {
-        'abs': abs,
-        'round': round,
-        'min': min,
-        'max': max,
-        'sum': sum,
-        'sqrt': math.sqrt,
-        'sin': math.sin,
-        'cos': math.cos,
-        'tan': math.tan,
-        'log': math.log,
-        'log10': math.log10,
-        'exp': math.exp,
-        'pow': pow,
-        'pi': math.pi,
-        'e': math.e,
-    }
+    # 编译结果缓存容量
+    COMPILED_CACHE_SIZE = 1024
     
     def __init__(self, tool_id: str = "calculator"):
         super().__init__(
@@ -52,6 +73,11 @@ class CalculatorTool(BaseTool):
             "calculator",
             "执行数学计算，支持基本运算和常用数学函数"
         )
+        
+        # 表达式 -> 校验通过后编译的代码对象（None表示需要走AST逐节点计算）
+        self._compiled: "OrderedDict[str, Optional[CodeType]]" = OrderedDict()
+        # 编译代码的执行环境：只暴露允许的函数和常量
+        self._eval_globals: Dict[str, Any] = {'__builtins__': {}, **self.ALLOWED_FUNCTIONS}
     
     def _define_parameters(self) -> Dict[str, Dict[str, Any]]:
         return {
@@ -121,67 +147,135 @@ class CalculatorTool(BaseTool):
         Returns:
             计算结果
         """
+        # 已校验的表达式直接执行编译好的代码对象
+        code = self._get_compiled(expression)
+        if code is not None:
+            return eval(code, self._eval_globals)
+        
         # 解析表达式为AST
-        try:
-            node = ast.parse(expression, mode='eval')
-        except SyntaxError:
-            raise ValueError(f"无效的表达式语法: {expression}")
+        node = _parse_expression(expression)
         
         # 验证并计算
-        return self._eval_node(node.body)
+        return self._eval_node(node)
+    
+    def _get_compiled(self, expression: str) -> Optional[CodeType]:
+        """
+        获取表达式编译后的代码对象
+        
+        首次遇到的表达式先按白名单校验整棵AST，只有全部节点都允许时才编译；
+        校验不通过时返回None，交给_eval_node计算并给出具体的错误信息。
+        """
+        if expression in self._compiled:
+            self._compiled.move_to_end(expression)
+            return self._compiled[expression]
+        
+        try:
+            node = _parse_expression(expression)
+        except ValueError:
+            return None
+        
+        code = None
+        if self._is_compilable(node):
+            code = compile(ast.Expression(body=node), '<calculator>', 'eval')
+        
+        self._compiled[expression] = code
+        if len(self._compiled) > self.COMPILED_CACHE_SIZE:
+            self._compiled.popitem(last=False)
+        return code
+    
+    def _is_compilable(self, node: ast.AST) -> bool:
+        """检查AST中的所有节点、操作符和名称是否都在白名单内"""
+        # 编译后的代码使用Python原生运算符；子类覆盖了操作符表时（如把ast.Div换成安全除法），
+        # 必须走_eval_node才能用上覆盖后的实现
+        if self.ALLOWED_OPERATORS is not _ALLOWED_OPERATORS:
+            return False
+        
+        for child in ast.walk(node):
+            child_type = type(child)
+            if child_type in self._NODE_HANDLERS or child_type is ast.Load:
+                if child_type is ast.Name and child.id not in self.ALLOWED_FUNCTIONS:
+                    return False
+                if child_type is ast.Call and (not isinstance(child.func, ast.Name) or child.keywords):
+                    return False
+            elif child_type not in self.ALLOWED_OPERATORS:
+                return False
+        return True
     
     def _eval_node(self, node):
-        """递归计算AST节点"""
-        if isinstance(node, ast.Constant):  # Python 3.8+
-            return node.value
-        elif isinstance(node, ast.Num):  # Python 3.7
-            return node.n
-        elif isinstance(node, ast.Name):
-            # 允许使用数学常量
-            if node.id in self.ALLOWED_FUNCTIONS:
-                return self.ALLOWED_FUNCTIONS[node.id]
-            else:
-                raise ValueError(f"不允许的变量: {node.id}")
-        elif isinstance(node, ast.BinOp):
-            # 二元操作
-            op_type = type(node.op)
-            if op_type not in self.ALLOWED_OPERATORS:
-                raise ValueError(f"不允许的操作符: {op_type.__name__}")
+        """递归计算AST节点：按节点类型查分派表，每个节点只做一次字典查找"""
+        handler = self._NODE_HANDLERS.get(node.__class__)
+        if handler is None:
+            raise ValueError(f"不支持的表达式类型: {type(node).__name__}")
+        return handler(self, node)
+    
+    def _eval_constant(self, node):
+        """常量"""
+        return node.value
+    
+    def _eval_num(self, node):
+        """数字常量（Python 3.7）"""
+        return node.n
+    
+    def _eval_name(self, node):
+        """名称：允许使用数学常量"""
+        if node.id in self.ALLOWED_FUNCTIONS:
+            return self.ALLOWED_FUNCTIONS[node.id]
+        else:
+            raise ValueError(f"不允许的变量: {node.id}")
+    
+    def _eval_binop(self, node):
+        """二元操作"""
+        op_type = node.op.__class__
+        if op_type not in self.ALLOWED_OPERATORS:
+            raise ValueError(f"不允许的操作符: {op_type.__name__}")
+        
+        left = self._eval_node(node.left)
+        right = self._eval_node(node.right)
+        return self.ALLOWED_OPERATORS[op_type](left, right)
+    
+    def _eval_unaryop(self, node):
+        """一元操作"""
+        op_type = node.op.__class__
+        if op_type not in self.ALLOWED_OPERATORS:
+            raise ValueError(f"不允许的操作符: {op_type.__name__}")
+        
+        operand = self._eval_node(node.operand)
+        return self.ALLOWED_OPERATORS[op_type](operand)
+    
+    def _eval_call(self, node):
+        """函数调用"""
+        if isinstance(node.func, ast.Name):
+            func_name = node.func.id
+            if func_name not in self.ALLOWED_FUNCTIONS:
+                raise ValueError(f"不允许的函数: {func_name}")
             
-            left = self._eval_node(node.left)
-            right = self._eval_node(node.right)
-            return self.ALLOWED_OPERATORS[op_type](left, right)
-        elif isinstance(node, ast.UnaryOp):
-            # 一元操作
-            op_type = type(node.op)
-            if op_type not in self.ALLOWED_OPERATORS:
-                raise ValueError(f"不允许的操作符: {op_type.__name__}")
+            func = self.ALLOWED_FUNCTIONS[func_name]
+            args = [self._eval_node(arg) for arg in node.args]
             
-            operand = self._eval_node(node.operand)
-            return self.ALLOWED_OPERATORS[op_type](operand)
-        elif isinstance(node, ast.Call):
-            # 函数调用
-            if isinstance(node.func, ast.Name):
-                func_name = node.func.id
-                if func_name not in self.ALLOWED_FUNCTIONS:
-                    raise ValueError(f"不允许的函数: {func_name}")
-                
-                func = self.ALLOWED_FUNCTIONS[func_name]
-                args = [self._eval_node(arg) for arg in node.args]
-                
-                # 处理特殊情况
-                if func_name == 'log' and len(args) == 2:
-                    # log(x, base)
-                    return math.log(args[0], args[1])
-                
-                return func(*args)
-            else:
-                raise ValueError("不支持的函数调用格式")
-        elif isinstance(node, ast.List):
-            # 列表（用于sum, min, max等）
-            return [self._eval_node(elem) for elem in node.elts]
+            # 处理特殊情况
+            if func_name == 'log' and len(args) == 2:
+                # log(x, base)
+                return math.log(args[0], args[1])
+            
+            return func(*args)
         else:
-            raise ValueError(f"不支持的表达式类型: {type(node).__name__}")
+            raise ValueError("不支持的函数调用格式")
+    
+    def _eval_list(self, node):
+        """列表（用于sum, min, max等）"""
+        return [self._eval_node(elem) for elem in node.elts]
+    
+    # AST节点类型 -> 计算方法
+    _NODE_HANDLERS = {
+        ast.Constant: _eval_constant,  # Python 3.8+
+        ast.Name: _eval_name,
+        ast.BinOp: _eval_binop,
+        ast.UnaryOp: _eval_unaryop,
+        ast.Call: _eval_call,
+        ast.List: _eval_list,
+    }
+    if sys.version_info < (3, 8):
+        _NODE_HANDLERS[ast.Num] = _eval_num  # Python 3.7
     
     def get_usage_example(self) -> str:
         """获取使用示例"""
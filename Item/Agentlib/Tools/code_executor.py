@@ -4,18 +4,243 @@ CodeExecutorTool - 代码执行工具
 """
 
 import sys
-import io
+import builtins
+import ctypes
+import signal
+import threading
+import importlib
+import functools
+import hashlib
+import re
+import reprlib
 import traceback
-import contextlib
-from typing import Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from types import CodeType, ModuleType
+from typing import Dict, Any, List, Optional, Tuple, AbstractSet, Callable
 import ast
 
 from .base_tool import BaseTool, ToolResult
 
 
+# 安全的内置函数白名单
+_SAFE_BUILTINS = frozenset({
+    'abs', 'all', 'any', 'ascii', 'bin', 'bool', 'chr', 'dict',
+    'divmod', 'enumerate', 'filter', 'float', 'format', 'hex',
+    'int', 'isinstance', 'len', 'list', 'map', 'max', 'min',
+    'oct', 'ord', 'pow', 'print', 'range', 'reversed', 'round',
+    'set', 'sorted', 'str', 'sum', 'tuple', 'type', 'zip'
+})
+
+# 允许的模块
+# string不在其中：string.Formatter().get_field会按字符串中的路径做属性查找，可以绕过语法层面的检查
+_ALLOWED_MODULES = frozenset({
+    'math', 'random', 'datetime', 'json', 're', 'collections',
+    'itertools', 'functools'
+})
+
+# 禁止的关键字（名称和属性名都会检查）
+_FORBIDDEN_KEYWORDS = frozenset({
+    '__import__', 'eval', 'exec', 'compile', 'open',
+    'file', 'input', 'raw_input', 'execfile',
+    'globals', 'locals', 'vars', 'dir',
+    'getattr', 'setattr', 'delattr'
+})
+
+# 禁止的模块
+_FORBIDDEN_MODULES = frozenset({
+    'os', 'sys', 'subprocess', 'socket', 'requests',
+    'urllib', 'pickle', 'shelve', 'tempfile', 'shutil'
+})
+
+# 结果变量的预览：字符串和其他对象的表示都有长度上限，容器只展开前几项
+_variable_repr = reprlib.Repr()
+_variable_repr.maxstring = 200
+_variable_repr.maxother = 200
+
+
+class _ExecutionTimeout(BaseException):
+    """代码执行超时；继承BaseException，代码片段中的except Exception无法吞掉"""
+
+
+def _make_restricted_import(allowed_modules: AbstractSet[str]) -> Callable:
+    """创建只允许导入白名单模块的__import__，供执行环境中的import语句使用"""
+    allowed = frozenset(allowed_modules)
+    
+    def restricted_import(name, globals=None, locals=None, fromlist=(), level=0):
+        if level != 0 or name.split('.')[0] not in allowed:
+            raise ImportError(f"不允许导入模块：{name}")
+        return builtins.__import__(name, globals, locals, fromlist, level)
+    
+    return restricted_import
+
+
+class _OutputBuffer:
+    """收集代码片段输出的轻量缓冲区，只在最后拼接一次"""
+    
+    def __init__(self):
+        self.parts: List[str] = []
+    
+    def write(self, text: str) -> int:
+        self.parts.append(text)
+        return len(text)
+    
+    def flush(self) -> None:
+        pass
+    
+    def getvalue(self) -> str:
+        return "".join(self.parts)
+
+
+def _make_buffered_print(buffer: _OutputBuffer) -> Callable:
+    """创建输出到指定缓冲区的print，只替换执行环境中的print，不改动全局的sys.stdout"""
+    def buffered_print(*args, sep=' ', end='\n', file=None, flush=False):
+        builtins.print(*args, sep=sep, end=end, file=buffer if file is None else file)
+    
+    return buffered_print
+
+
+@functools.lru_cache(maxsize=8)
+def _forbidden_words_pattern(words: frozenset) -> "re.Pattern":
+    """把禁止的关键字和模块名合并为一个按完整标识符匹配的正则"""
+    return re.compile(r'\b(' + '|'.join(map(re.escape, sorted(words))) + r')\b')
+
+
+@functools.lru_cache(maxsize=8)
+def _module_escape_attributes(allowed_modules: frozenset, max_depth: int = 4) -> frozenset:
+    """
+    找出允许模块中指向白名单外模块的公开属性名
+    
+    允许模块内部会引用其他模块，且不一定经过下划线属性（如Python 3.11中re.enum，而enum.bltns就是builtins），
+    语法检查只能按属性名拦截这些路径；从允许模块出发沿公开属性遍历模块和类，深度有限。
+    """
+    escape_names = set()
+    seen = set()
+    queue = []
+    for module_name in allowed_modules:
+        try:
+            queue.append((importlib.import_module(module_name), 0))
+        except ImportError:
+            continue
+    
+    while queue:
+        obj, depth = queue.pop(0)
+        if id(obj) in seen or depth >= max_depth:
+            continue
+        seen.add(id(obj))
+        
+        for name in dir(obj):
+            if name.startswith('_'):
+                continue
+            try:
+                value = getattr(obj, name)
+            except Exception:
+                continue
+            if isinstance(value, ModuleType):
+                if value.__name__.split('.')[0] not in allowed_modules:
+                    escape_names.add(name)
+                    continue
+                queue.append((value, depth + 1))
+            elif isinstance(value, type):
+                queue.append((value, depth + 1))
+    return frozenset(escape_names)
+
+
+class _SafetyVisitor(ast.NodeVisitor):
+    """代码安全检查的AST遍历器：一次遍历完成所有节点检查，发现第一处违规即停止"""
+    
+    def __init__(self, allowed_modules: AbstractSet[str], forbidden_keywords: AbstractSet[str],
+                 forbidden_modules: AbstractSet[str]):
+        self.allowed_modules = allowed_modules
+        self.forbidden_keywords = forbidden_keywords
+        self.forbidden_modules = forbidden_modules
+        self.forbidden_pattern = _forbidden_words_pattern(frozenset(forbidden_keywords) | frozenset(forbidden_modules))
+        self.escape_attributes = _module_escape_attributes(frozenset(allowed_modules))
+        self.violation: Optional[str] = None
+    
+    def visit(self, node: ast.AST) -> None:
+        if self.violation is None:
+            super().visit(node)
+    
+    def visit_Import(self, node: ast.Import) -> None:
+        for alias in node.names:
+            module_name = alias.name.split('.')[0]
+            if module_name not in self.allowed_modules:
+                self.violation = f"不允许导入模块：{module_name}"
+                return
+        self.generic_visit(node)
+    
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        module_name = node.module.split('.')[0] if node.module else ''
+        if module_name not in self.allowed_modules:
+            self.violation = f"不允许从模块导入：{module_name}"
+            return
+        # from re import enum 与 re.enum 等价，导入的名称按属性访问同样检查
+        for alias in node.names:
+            violation = self._check_attribute_name(alias.name)
+            if violation is not None:
+                self.violation = violation
+                return
+        self.generic_visit(node)
+    
+    def visit_Name(self, node: ast.Name) -> None:
+        if node.id in self.forbidden_keywords:
+            self.violation = f"不允许使用关键字：{node.id}"
+        elif node.id in self.forbidden_modules:
+            self.violation = f"不允许使用模块：{node.id}"
+        elif node.id.startswith('__'):
+            self.violation = f"不允许访问特殊名称：{node.id}"
+    
+    def _check_attribute_name(self, name: str) -> Optional[str]:
+        """检查属性名（或from导入的名称），违规时返回错误信息"""
+        # 下划线开头的属性是逃出受限环境的常见途径：__class__、__globals__，
+        # 以及允许模块内部引用的危险模块（如random._os）
+        if name.startswith('_'):
+            return f"不允许访问私有属性：{name}"
+        if name in self.forbidden_keywords:
+            return f"不允许使用关键字：{name}"
+        if name in self.forbidden_modules:
+            return f"不允许使用模块：{name}"
+        if name in self.escape_attributes:
+            return f"不允许访问白名单外的模块：{name}"
+        return None
+    
+    def visit_Attribute(self, node: ast.Attribute) -> None:
+        violation = self._check_attribute_name(node.attr)
+        if violation is not None:
+            self.violation = violation
+        else:
+            self.generic_visit(node)
+    
+    def visit_Constant(self, node: ast.Constant) -> None:
+        # 字符串中的属性路径和名称可能被按字符串查找（格式化、反射类API），语法检查看不到，
+        # 因此字符串常量同样不能包含双下划线或禁止的关键字、模块名
+        if isinstance(node.value, str):
+            if '__' in node.value:
+                self.violation = "字符串中不允许包含双下划线"
+                return
+            match = self.forbidden_pattern.search(node.value)
+            if match is not None:
+                self.violation = f"字符串中包含禁止的名称：{match.group(1)}"
+
+
 class CodeExecutorTool(BaseTool):
     """代码执行工具 - 执行Python代码"""
     
+    # 禁止的关键字和模块（所有实例和调用共享的只读集合）
+    FORBIDDEN_KEYWORDS = _FORBIDDEN_KEYWORDS
+    FORBIDDEN_MODULES = _FORBIDDEN_MODULES
+    
+    # 安全检查结果缓存容量
+    SAFETY_CACHE_SIZE = 256
+    
+    # 线程方式超时后，注入异常再等待线程退出的宽限时间（秒）
+    TIMEOUT_GRACE_PERIOD = 0.5
+    
+    # 返回的结果变量最多个数
+    MAX_RESULT_VARIABLES = 32
+    # 超过该大小（字节，sys.getsizeof）的变量只返回预览，不返回对象本身
+    MAX_VARIABLE_SIZE = 64 * 1024
+    
     def __init__(self, tool_id: str = "code_executor"):
         super().__init__(
             tool_id,
@@ -23,20 +248,24 @@ class CodeExecutorTool(BaseTool):
             "安全地执行Python代码片段"
         )
         
-        # 安全的内置函数白名单
-        self.safe_builtins = {
-            'abs', 'all', 'any', 'ascii', 'bin', 'bool', 'chr', 'dict',
-            'divmod', 'enumerate', 'filter', 'float', 'format', 'hex',
-            'int', 'isinstance', 'len', 'list', 'map', 'max', 'min',
-            'oct', 'ord', 'pow', 'print', 'range', 'reversed', 'round',
-            'set', 'sorted', 'str', 'sum', 'tuple', 'type', 'zip'
-        }
+        # 安全的内置函数白名单和允许的模块（默认共享模块级只读集合）
+        self.safe_builtins = _SAFE_BUILTINS
+        self.allowed_modules = _ALLOWED_MODULES
         
-        # 允许的模块
-        self.allowed_modules = {
-            'math', 'random', 'datetime', 'json', 're', 'collections',
-            'itertools', 'functools', 'string'
+        # 执行环境模板：内置函数和允许的模块只在初始化时查找、导入一次
+        self._builtins_template: Dict[str, Any] = {
+            name: getattr(builtins, name) for name in self.safe_builtins if hasattr(builtins, name)
         }
+        self._builtins_template['__import__'] = _make_restricted_import(self.allowed_modules)
+        self._modules_template: Dict[str, Any] = {}
+        for module_name in self.allowed_modules:
+            try:
+                self._modules_template[module_name] = importlib.import_module(module_name)
+            except ImportError:
+                pass  # 忽略不存在的模块
+        
+        # 代码摘要 -> (是否安全, 错误信息, 编译好的代码对象)（LRU）：重复提交的代码不再解析、检查和编译
+        self._safety_cache: "OrderedDict[bytes, Tuple[bool, Optional[str], Optional[CodeType]]]" = OrderedDict()
     
     def _define_parameters(self) -> Dict[str, Dict[str, Any]]:
         return {
@@ -63,7 +292,7 @@ class CodeExecutorTool(BaseTool):
         """执行代码"""
         try:
             # 验证代码安全性
-            is_safe, error_msg = self._validate_code_safety(code)
+            is_safe, error_msg, code_obj = self._check_code(code)
             if not is_safe:
                 return ToolResult(
                     success=False,
@@ -74,53 +303,54 @@ class CodeExecutorTool(BaseTool):
             # 准备执行环境
             exec_globals = self._prepare_execution_environment()
             
-            # 捕获输出
-            output_buffer = io.StringIO()
-            error_buffer = io.StringIO()
+            # 捕获输出：执行环境中的print写入本次执行自己的缓冲区，并发执行之间互不干扰
+            output_buffer = _OutputBuffer()
+            exec_globals['__builtins__']['print'] = _make_buffered_print(output_buffer)
             
-            with contextlib.redirect_stdout(output_buffer), contextlib.redirect_stderr(error_buffer):
-                try:
-                    # 执行代码
-                    exec(code, exec_globals)
-                    
-                    # 获取输出
-                    stdout = output_buffer.getvalue()
-                    stderr = error_buffer.getvalue()
-                    
-                    # 提取结果变量（如果有）
-                    result_vars = {}
-                    for var_name, var_value in exec_globals.items():
-                        if not var_name.startswith('__') and var_name not in self.allowed_modules:
-                            try:
-                                # 只保存可序列化的值
-                                str(var_value)  # 测试是否可以转换为字符串
-                                result_vars[var_name] = var_value
-                            except:
-                                result_vars[var_name] = f"<{type(var_value).__name__} object>"
-                    
-                    return ToolResult(
-                        success=True,
-                        data={
-                            "output": stdout if capture_output else None,
-                            "error_output": stderr if stderr and capture_output else None,
-                            "variables": result_vars,
-                            "code_lines": len(code.strip().split('\n'))
-                        }
-                    )
-                    
-                except Exception as e:
-                    # 获取详细的错误信息
-                    error_trace = traceback.format_exc()
-                    
-                    return ToolResult(
-                        success=False,
-                        data={
-                            "output": output_buffer.getvalue() if capture_output else None,
-                            "error_output": error_buffer.getvalue() if capture_output else None
-                        },
-                        error=f"执行错误：{str(e)}\n{error_trace if capture_output else ''}"
-                    )
-                    
+            try:
+                # 执行代码
+                self._exec_with_timeout(code_obj if code_obj is not None else code, exec_globals, timeout)
+                
+                # 获取输出
+                stdout = output_buffer.getvalue()
+                
+                # 提取结果变量（如果有）
+                result_vars = self._collect_result_variables(exec_globals)
+                
+                return ToolResult(
+                    success=True,
+                    data={
+                        "output": stdout if capture_output else None,
+                        "error_output": None,
+                        "variables": result_vars,
+                        "code_lines": len(code.strip().split('\n'))
+                    }
+                )
+                
+            except _ExecutionTimeout:
+                return ToolResult(
+                    success=False,
+                    data={
+                        "output": output_buffer.getvalue() if capture_output else None,
+                        "error_output": None
+                    },
+                    error=f"执行超时：代码运行超过{timeout}秒"
+                )
+                
+            except BaseException as e:
+                # 代码片段中的SystemExit、KeyboardInterrupt等同样作为执行错误返回，不向上传播
+                # 获取详细的错误信息
+                error_trace = traceback.format_exc()
+                
+                return ToolResult(
+                    success=False,
+                    data={
+                        "output": output_buffer.getvalue() if capture_output else None,
+                        "error_output": None
+                    },
+                    error=f"执行错误：{str(e)}\n{error_trace if capture_output else ''}"
+                )
+                
         except Exception as e:
             return ToolResult(
                 success=False,
@@ -128,51 +358,117 @@ class CodeExecutorTool(BaseTool):
                 error=f"代码执行环境错误：{str(e)}"
             )
     
-    def _validate_code_safety(self, code: str) -> Tuple[bool, Optional[str]]:
-        """验证代码安全性"""
-        # 禁止的关键字
-        forbidden_keywords = {
-            '__import__', 'eval', 'exec', 'compile', 'open',
-            'file', 'input', 'raw_input', 'execfile',
-            'globals', 'locals', 'vars', 'dir'
-        }
+    def _exec_with_timeout(self, code: Any, exec_globals: Dict[str, Any], timeout: Optional[float]) -> None:
+        """
+        执行代码，超过timeout秒时抛出_ExecutionTimeout（timeout不大于0时不限时）
         
-        # 禁止的模块
-        forbidden_modules = {
-            'os', 'sys', 'subprocess', 'socket', 'requests',
-            'urllib', 'pickle', 'shelve', 'tempfile', 'shutil'
-        }
+        主线程上用SIGALRM + setitimer中断执行；其他线程或不支持SIGALRM的平台（Windows）
+        在守护线程中执行并等待timeout秒，超时后向该线程注入异常使其停止。
+        两种方式都只能在字节码之间生效：卡在C代码中的计算（如10**10**8、超大列表的sorted）
+        要等这一步结束才会被中断，用裸except吞掉异常的代码则可能一直运行下去；
+        注入异常后线程在宽限时间内仍未退出时记录警告，该线程无法强制结束，会继续占用执行环境。
+        """
+        if not timeout or timeout <= 0:
+            exec(code, exec_globals)
+            return
+        
+        if hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread():
+            def on_timeout(signum, frame):
+                raise _ExecutionTimeout()
+            
+            previous_handler = signal.signal(signal.SIGALRM, on_timeout)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+            try:
+                exec(code, exec_globals)
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previous_handler)
+            return
+        
+        outcome: Dict[str, BaseException] = {}
         
+        def run() -> None:
+            try:
+                exec(code, exec_globals)
+            except BaseException as e:
+                outcome['error'] = e
+        
+        worker = threading.Thread(target=run, name="code-executor", daemon=True)
+        worker.start()
+        worker.join(timeout)
+        if worker.is_alive():
+            # 在执行线程中异步抛出超时异常，纯Python循环会在下一条字节码处停止
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(worker.ident), ctypes.py_object(_ExecutionTimeout))
+            worker.join(self.TIMEOUT_GRACE_PERIOD)
+            if worker.is_alive():
+                self.log_warning(f"Code execution thread did not stop within {self.TIMEOUT_GRACE_PERIOD}s after timeout, thread leaked")
+            raise _ExecutionTimeout()
+        if 'error' in outcome:
+            raise outcome['error']
+    
+    def _collect_result_variables(self, exec_globals: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        提取代码执行后定义的变量
+        
+        最多返回MAX_RESULT_VARIABLES个；只用有长度上限的repr检查能否转换为字符串，
+        不对大对象做完整的字符串化，超过MAX_VARIABLE_SIZE的变量只返回预览。
+        """
+        result_vars = {}
+        for var_name, var_value in exec_globals.items():
+            if var_name.startswith('__') or var_name in self.allowed_modules:
+                continue
+            if len(result_vars) >= self.MAX_RESULT_VARIABLES:
+                break
+            
+            type_name = type(var_value).__name__
+            try:
+                preview = _variable_repr.repr(var_value)  # 测试是否可以转换为字符串
+                if sys.getsizeof(var_value) > self.MAX_VARIABLE_SIZE:
+                    result_vars[var_name] = f"<{type_name} object: {preview}>"
+                else:
+                    result_vars[var_name] = var_value
+            except Exception:
+                result_vars[var_name] = f"<{type_name} object>"
+        return result_vars
+    
+    def _check_code(self, code: str) -> Tuple[bool, Optional[str], Optional[CodeType]]:
+        """
+        检查代码安全性并编译，结果按代码摘要缓存
+        
+        Returns:
+            (是否安全, 错误信息, 代码对象)；代码对象为None时（如编译期语法错误）由exec直接执行源码并报告错误
+        """
+        key = hashlib.blake2b(code.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+        cached = self._safety_cache.get(key)
+        if cached is not None:
+            self._safety_cache.move_to_end(key)
+            return cached
+        
+        is_safe, error_msg = self._validate_code_safety(code)
+        code_obj = None
+        if is_safe:
+            try:
+                code_obj = compile(code, '<string>', 'exec')
+            except (SyntaxError, ValueError):
+                pass
+        
+        cached = (is_safe, error_msg, code_obj)
+        self._safety_cache[key] = cached
+        if len(self._safety_cache) > self.SAFETY_CACHE_SIZE:
+            self._safety_cache.popitem(last=False)
+        return cached
+    
+    def _validate_code_safety(self, code: str) -> Tuple[bool, Optional[str]]:
+        """验证代码安全性"""
         try:
             # 解析代码为AST
             tree = ast.parse(code)
             
-            # 检查导入
-            for node in ast.walk(tree):
-                if isinstance(node, ast.Import):
-                    for alias in node.names:
-                        module_name = alias.name.split('.')[0]
-                        if module_name not in self.allowed_modules:
-                            return False, f"不允许导入模块：{module_name}"
-                
-                elif isinstance(node, ast.ImportFrom):
-                    module_name = node.module.split('.')[0] if node.module else ''
-                    if module_name not in self.allowed_modules:
-                        return False, f"不允许从模块导入：{module_name}"
-                
-                elif isinstance(node, ast.Name):
-                    if node.id in forbidden_keywords:
-                        return False, f"不允许使用关键字：{node.id}"
-            
-            # 检查代码文本中的危险模式
-            code_lower = code.lower()
-            for keyword in forbidden_keywords:
-                if keyword in code_lower:
-                    return False, f"代码中包含禁止的关键字：{keyword}"
-            
-            for module in forbidden_modules:
-                if module in code_lower:
-                    return False, f"代码中包含禁止的模块：{module}"
+            # 检查导入、名称和属性访问
+            visitor = _SafetyVisitor(self.allowed_modules, self.FORBIDDEN_KEYWORDS, self.FORBIDDEN_MODULES)
+            visitor.visit(tree)
+            if visitor.violation is not None:
+                return False, visitor.violation
             
             return True, None
             
@@ -182,22 +478,9 @@ class CodeExecutorTool(BaseTool):
             return False, f"代码分析错误：{str(e)}"
     
     def _prepare_execution_environment(self) -> Dict[str, Any]:
-        """准备执行环境"""
-        # 创建受限的内置函数字典
-        safe_builtins_dict = {}
-        for name in self.safe_builtins:
-            if hasattr(__builtins__, name):
-                safe_builtins_dict[name] = getattr(__builtins__, name)
-        
-        # 导入允许的模块
-        exec_globals = {'__builtins__': safe_builtins_dict}
-        
-        for module_name in self.allowed_modules:
-            try:
-                exec_globals[module_name] = __import__(module_name)
-            except ImportError:
-                pass  # 忽略不存在的模块
-        
+        """准备执行环境（复制初始化时构建的模板，各次执行互不影响）"""
+        exec_globals = {'__builtins__': dict(self._builtins_template)}
+        exec_globals.update(self._modules_template)
         return exec_globals
     
     def get_usage_example(self) -> str:
@@ -5,7 +5,12 @@ FileTool - 文件操作工具
 
 import os
 import json
-from typing import Dict, Any, List
+import asyncio
+import codecs
+import functools
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List
 from pathlib import Path
 
 from .base_tool import BaseTool, ToolResult
@@ -14,6 +19,9 @@ from .base_tool import BaseTool, ToolResult
 class FileTool(BaseTool):
     """文件操作工具 - 读写文件"""
     
+    # 文件操作专用线程池的线程数
+    IO_WORKERS = 8
+    
     def __init__(self, tool_id: str = "file_tool", workspace_dir: str = "./workspace"):
         super().__init__(
             tool_id,
@@ -24,6 +32,12 @@ class FileTool(BaseTool):
         # 设置工作空间目录（安全限制）
         self.workspace_dir = Path(workspace_dir).resolve()
         self.workspace_dir.mkdir(exist_ok=True)
+        
+        # 单次读取的最大字节数，超出部分截断不读
+        self.max_read_bytes = 10 * 1024 * 1024
+        
+        # 专用的有界线程池：大文件读取和大目录列举不会占满默认线程池、拖慢其他使用默认线程池的调用
+        self._executor = ThreadPoolExecutor(max_workers=self.IO_WORKERS, thread_name_prefix="file_tool")
     
     def _define_parameters(self) -> Dict[str, Dict[str, Any]]:
         return {
@@ -95,53 +109,89 @@ class FileTool(BaseTool):
         # 转换为Path对象并规范化
         target_path = (self.workspace_dir / path).resolve()
         
-        # 确保路径在工作空间内
-        if not str(target_path).startswith(str(self.workspace_dir)):
-            raise ValueError(f"路径超出工作空间范围: {path}")
+        # 确保路径在工作空间内（按路径层级比较，/workspace_evil 不会被当作 /workspace 的子路径）
+        # （Path.is_relative_to需要Python 3.9+，这里用relative_to的ValueError判断）
+        try:
+            target_path.relative_to(self.workspace_dir)
+        except ValueError:
+            raise ValueError(f"路径超出工作空间范围: {path}") from None
         
         return target_path
     
+    async def _run_blocking(self, func: Callable[..., ToolResult], *args: Any) -> ToolResult:
+        """在文件操作专用线程池中执行阻塞函数"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+    
+    async def close(self) -> None:
+        """关闭文件操作线程池（不等待进行中的操作）"""
+        self._executor.shutdown(wait=False)
+    
     async def _read_file(self, file_path: Path, encoding: str) -> ToolResult:
-        """读取文件"""
-        if not file_path.exists():
+        """读取文件（磁盘操作在专用线程池中执行，不阻塞事件循环）"""
+        return await self._run_blocking(self._read_file_sync, file_path, encoding)
+    
+    def _read_file_sync(self, file_path: Path, encoding: str) -> ToolResult:
+        """读取文件（先stat确认类型和大小，只读取一次文件内容）"""
+        try:
+            file_stat = file_path.stat()
+        except FileNotFoundError:
             return ToolResult(
                 success=False,
                 data=None,
                 error=f"文件不存在: {file_path.name}"
             )
         
-        if not file_path.is_file():
+        if not stat.S_ISREG(file_stat.st_mode):
             return ToolResult(
                 success=False,
                 data=None,
                 error=f"不是文件: {file_path.name}"
             )
         
+        file_size = file_stat.st_size
+        truncated = file_size > self.max_read_bytes
+        with open(file_path, 'rb') as f:
+            raw = f.read(self.max_read_bytes) if truncated else f.read()
+        
         try:
-            content = file_path.read_text(encoding=encoding)
-            return ToolResult(
-                success=True,
-                data={
-                    "path": str(file_path.relative_to(self.workspace_dir)),
-                    "content": content,
-                    "size": len(content),
-                    "encoding": encoding
-                }
-            )
+            if truncated:
+                # 截断处可能落在多字节字符中间，增量解码器会保留不完整的尾部
+                content = codecs.getincrementaldecoder(encoding)().decode(raw, final=False)
+            else:
+                content = raw.decode(encoding)
         except UnicodeDecodeError:
-            # 尝试读取为二进制
-            content = file_path.read_bytes()
+            # 二进制文件：复用已读取的内容，不再重复读取
             return ToolResult(
                 success=True,
                 data={
                     "path": str(file_path.relative_to(self.workspace_dir)),
-                    "content": f"[二进制文件，大小: {len(content)} 字节]",
-                    "size": len(content),
+                    "content": f"[二进制文件，大小: {file_size} 字节]",
+                    "size": file_size,
                     "is_binary": True
                 }
             )
+        
+        # 与文本模式读取一致，统一换行符
+        if '\r' in content:
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
+        
+        data = {
+            "path": str(file_path.relative_to(self.workspace_dir)),
+            "content": content,
+            "size": len(content),
+            "encoding": encoding
+        }
+        if truncated:
+            data["truncated"] = True
+            data["file_size"] = file_size
+        return ToolResult(success=True, data=data)
     
     async def _write_file(self, file_path: Path, content: str, encoding: str) -> ToolResult:
+        """写入文件（磁盘操作在专用线程池中执行，不阻塞事件循环）"""
+        return await self._run_blocking(self._write_file_sync, file_path, content, encoding)
+    
+    def _write_file_sync(self, file_path: Path, content: str, encoding: str) -> ToolResult:
         """写入文件"""
         # 确保父目录存在
         file_path.parent.mkdir(parents=True, exist_ok=True)
@@ -159,6 +209,10 @@ class FileTool(BaseTool):
         )
     
     async def _list_files(self, dir_path: Path) -> ToolResult:
+        """列出目录内容（磁盘操作在专用线程池中执行，不阻塞事件循环）"""
+        return await self._run_blocking(self._list_files_sync, dir_path)
+    
+    def _list_files_sync(self, dir_path: Path) -> ToolResult:
         """列出目录内容"""
         if not dir_path.exists():
             return ToolResult(
@@ -174,26 +228,34 @@ class FileTool(BaseTool):
                 error=f"不是目录: {dir_path.name}"
             )
         
+        # os.scandir读取目录时已带回条目类型，is_dir/is_file无需逐个stat；只有文件大小需要stat且结果会被缓存
+        dir_relative = str(dir_path.relative_to(self.workspace_dir))
+        prefix = "" if dir_relative == "." else dir_relative + os.sep
         files = []
-        for item in dir_path.iterdir():
-            relative_path = item.relative_to(self.workspace_dir)
-            files.append({
-                "name": item.name,
-                "path": str(relative_path),
-                "type": "directory" if item.is_dir() else "file",
-                "size": item.stat().st_size if item.is_file() else None
-            })
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                is_file = entry.is_file()
+                files.append({
+                    "name": entry.name,
+                    "path": prefix + entry.name,
+                    "type": "directory" if entry.is_dir() else "file",
+                    "size": entry.stat().st_size if is_file else None
+                })
         
         return ToolResult(
             success=True,
             data={
-                "path": str(dir_path.relative_to(self.workspace_dir)),
+                "path": dir_relative,
                 "files": files,
                 "count": len(files)
             }
         )
     
     async def _delete_file(self, file_path: Path) -> ToolResult:
+        """删除文件（磁盘操作在专用线程池中执行，不阻塞事件循环）"""
+        return await self._run_blocking(self._delete_file_sync, file_path)
+    
+    def _delete_file_sync(self, file_path: Path) -> ToolResult:
         """删除文件"""
         if not file_path.exists():
             return ToolResult(
@@ -13,6 +13,60 @@ from .base_tool import BaseTool, ToolResult
 class WebSearchTool(BaseTool):
     """网络搜索工具 - 搜索网络信息"""
     
+    # 模拟搜索延迟（秒），为0时不等待
+    MOCK_LATENCY = 0.5
+    
+    # 各搜索类型的模拟结果模板，字符串中的{query}和{slug}在生成结果时填入
+    _MOCK_TEMPLATES = {
+        "web": (
+            {
+                "title": "关于{query}的综合介绍",
+                "url": "https://example.com/{slug}",
+                "snippet": "这是一篇关于{query}的详细介绍文章，包含了基本概念、应用场景和最佳实践..."
+            },
+            {
+                "title": "{query}入门指南",
+                "url": "https://guide.example.com/{slug}",
+                "snippet": "本指南将帮助您快速了解{query}的基础知识，适合初学者阅读..."
+            },
+            {
+                "title": "{query}的最新发展",
+                "url": "https://news.example.com/{slug}",
+                "snippet": "了解{query}领域的最新动态和发展趋势，包括行业分析和专家观点..."
+            }
+        ),
+        "news": (
+            {
+                "title": "突破：{query}领域取得重大进展",
+                "url": "https://news.example.com/breakthrough-{slug}",
+                "snippet": "科学家在{query}研究中取得突破性进展，这一发现可能改变我们的认知...",
+                "date": "2024-01-15"
+            },
+            {
+                "title": "{query}市场分析报告发布",
+                "url": "https://business.example.com/{slug}-report",
+                "snippet": "最新的市场分析显示，{query}行业正在经历快速增长...",
+                "date": "2024-01-10"
+            }
+        ),
+        "academic": (
+            {
+                "title": "A Survey on {query}",
+                "url": "https://academic.example.com/paper/{slug}",
+                "snippet": "This paper presents a comprehensive survey of recent advances in {query}...",
+                "authors": ["Smith, J.", "Doe, A."],
+                "year": 2023
+            },
+            {
+                "title": "Novel Approaches to {query}",
+                "url": "https://research.example.com/{slug}-novel",
+                "snippet": "We propose a novel framework for addressing challenges in {query}...",
+                "authors": ["Johnson, M.", "Lee, K."],
+                "year": 2024
+            }
+        )
+    }
+    
     def __init__(self, tool_id: str = "web_search"):
         super().__init__(
             tool_id,
@@ -45,7 +99,8 @@ class WebSearchTool(BaseTool):
         """执行搜索（模拟实现）"""
         try:
             # 模拟搜索延迟
-            await asyncio.sleep(0.5)
+            if self.MOCK_LATENCY > 0:
+                await asyncio.sleep(self.MOCK_LATENCY)
             
             # 生成模拟搜索结果
             results = self._generate_mock_results(query, max_results, search_type)
@@ -73,68 +128,28 @@ class WebSearchTool(BaseTool):
     
     def _generate_mock_results(self, query: str, max_results: int, search_type: str) -> List[Dict[str, Any]]:
         """生成模拟搜索结果"""
-        results = []
-        
-        # 根据搜索类型生成不同的结果
-        if search_type == "web":
-            templates = [
-                {
-                    "title": f"关于{query}的综合介绍",
-                    "url": f"https://example.com/{query.replace(' ', '-')}",
-                    "snippet": f"这是一篇关于{query}的详细介绍文章，包含了基本概念、应用场景和最佳实践..."
-                },
-                {
-                    "title": f"{query}入门指南",
-                    "url": f"https://guide.example.com/{query.replace(' ', '-')}",
-                    "snippet": f"本指南将帮助您快速了解{query}的基础知识，适合初学者阅读..."
-                },
-                {
-                    "title": f"{query}的最新发展",
-                    "url": f"https://news.example.com/{query.replace(' ', '-')}",
-                    "snippet": f"了解{query}领域的最新动态和发展趋势，包括行业分析和专家观点..."
-                }
-            ]
-        elif search_type == "news":
-            templates = [
-                {
-                    "title": f"突破：{query}领域取得重大进展",
-                    "url": f"https://news.example.com/breakthrough-{query.replace(' ', '-')}",
-                    "snippet": f"科学家在{query}研究中取得突破性进展，这一发现可能改变我们的认知...",
-                    "date": "2024-01-15"
-                },
-                {
-                    "title": f"{query}市场分析报告发布",
-                    "url": f"https://business.example.com/{query.replace(' ', '-')}-report",
-                    "snippet": f"最新的市场分析显示，{query}行业正在经历快速增长...",
-                    "date": "2024-01-10"
-                }
-            ]
-        else:  # academic
-            templates = [
-                {
-                    "title": f"A Survey on {query}",
-                    "url": f"https://academic.example.com/paper/{query.replace(' ', '-')}",
-                    "snippet": f"This paper presents a comprehensive survey of recent advances in {query}...",
-                    "authors": ["Smith, J.", "Doe, A."],
-                    "year": 2023
-                },
-                {
-                    "title": f"Novel Approaches to {query}",
-                    "url": f"https://research.example.com/{query.replace(' ', '-')}-novel",
-                    "snippet": f"We propose a novel framework for addressing challenges in {query}...",
-                    "authors": ["Johnson, M.", "Lee, K."],
-                    "year": 2024
-                }
-            ]
+        # 根据搜索类型选择模板（未知类型按学术搜索处理）
+        templates = self._MOCK_TEMPLATES.get(search_type, self._MOCK_TEMPLATES["academic"])
+        slug = query.replace(' ', '-')
         
         # 返回指定数量的结果
-        for i in range(min(max_results, len(templates))):
-            if i < len(templates):
-                result = templates[i].copy()
-                result["rank"] = i + 1
-                results.append(result)
-        
-        return results
+        return [
+            self._render_mock_result(template, query, slug, rank)
+            for rank, template in enumerate(templates[:max(int(max_results), 0)], 1)
+        ]
+    
+    def _render_mock_result(self, template: Dict[str, Any], query: str, slug: str, rank: int) -> Dict[str, Any]:
+        """用查询词填充一个结果模板并附上排名（列表值复制一份，避免调用方修改共享模板）"""
+        result = {}
+        for key, value in template.items():
+            if isinstance(value, str):
+                result[key] = value.format(query=query, slug=slug)
+            elif isinstance(value, list):
+                result[key] = list(value)
+            else:
+                result[key] = value
+        result["rank"] = rank
+        return result
     
     def get_usage_example(self) -> str:
         """获取使用示例"""
@@ -424,14 +424,14 @@ class EnhancedModelAdapter(ModelBase):
             await self.connector.close()
             self.connector = None
     
-    async def generate(self, prompt: str, context=None, **kwargs) -> str:
+    async def generate(self, prompt: str, context=None, system: Optional[str] = None, **kwargs) -> str:
         """增强的生成方法"""
         try:
             # 初始化HTTP客户端
             await self._initialize_http_client()
             
             # 格式化消息
-            messages = self._format_context_to_messages(prompt, context)
+            messages = self._format_context_to_messages(prompt, context, system)
             
             # 合并配置参数
             call_params = {
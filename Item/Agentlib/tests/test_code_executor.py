@@ -0,0 +1,58 @@
+"""
+CodeExecutorTool 安全检查回归测试
+"""
+
+import asyncio
+import unittest
+from unittest import mock
+
+from Item.Agentlib.Tools.code_executor import CodeExecutorTool
+
+
+class CodeExecutorSafetyTest(unittest.TestCase):
+    """代码安全检查"""
+    
+    def setUp(self):
+        self.tool = CodeExecutorTool()
+    
+    def test_formatter_get_field_escape_rejected(self):
+        """字符串中的属性路径（string.Formatter().get_field）不能绕过检查"""
+        code = (
+            "g = string.Formatter().get_field('0.__globals__', [json.dumps], {})[0]; "
+            "g['__builtins__']['__import__']('o'+'s').getcwd()"
+        )
+        
+        is_safe, _ = self.tool._validate_code_safety(code)
+        self.assertFalse(is_safe)
+        
+        result = asyncio.run(self.tool.execute(code=code))
+        self.assertFalse(result.success)
+        self.assertIn("代码安全检查失败", result.error)
+    
+    def test_string_module_not_importable(self):
+        """string模块不在允许的模块中"""
+        is_safe, _ = self.tool._validate_code_safety("import string")
+        self.assertFalse(is_safe)
+    
+    def test_module_attribute_escape_rejected(self):
+        """允许模块引用的白名单外模块（re.enum.bltns即builtins）不能通过属性或from导入访问"""
+        for code in ("import re\nb = re.enum.bltns", "from re import enum"):
+            is_safe, _ = self.tool._validate_code_safety(code)
+            self.assertFalse(is_safe, code)
+    
+    def test_base_exception_becomes_failed_result(self):
+        """代码片段抛出的SystemExit作为执行错误返回，不向上传播"""
+        with mock.patch.object(self.tool, '_exec_with_timeout', side_effect=SystemExit(3)):
+            result = asyncio.run(self.tool.execute(code="x = 1"))
+        self.assertFalse(result.success)
+        self.assertIn("执行错误", result.error)
+    
+    def test_plain_code_still_runs(self):
+        """普通代码照常执行"""
+        result = asyncio.run(self.tool.execute(code="import math\nx = math.sqrt(16)\nprint(x)"))
+        self.assertTrue(result.success)
+        self.assertEqual(result.data["output"], "4.0\n")
+
+
+if __name__ == "__main__":
+    unittest.main()